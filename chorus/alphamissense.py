@@ -0,0 +1,230 @@
+import io
+import mmap
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# column names given to the rows read from an alphamissense tabulated file, the same names the analysis scripts use
+ALPHAMISSENSE_COLUMNS = ["UniprotID", "Variant", "Score", "Pathogenicity"]
+# number of leading bytes of every line compared to find the protein boundaries, uniprot accessions are at most 10 characters long plus an isoform suffix
+ACCESSION_WINDOW = 32
+# size of the uncompressed chunks scanned at once while building an index
+INDEX_CHUNK_SIZE = 16 * 1024 * 1024
+_bgzf_magic = b"\x1f\x8b\x08\x04"
+
+
+def default_index_path(file_path: str):
+    return f"{file_path}.idx.npz"
+
+
+def _bgzf_block_size(data, offset: int):
+    """return the total size of the bgzf block starting at offset by reading the BC subfield of its gzip header"""
+    if data[offset:offset + 4] != _bgzf_magic:
+        raise ValueError(f"Invalid bgzf block at byte {offset}, gzip compressed files have to be compressed with bgzip for random access")
+    extra_length = int.from_bytes(data[offset + 10:offset + 12], "little")
+    position = offset + 12
+    while position < offset + 12 + extra_length:
+        subfield_length = int.from_bytes(data[position + 2:position + 4], "little")
+        if data[position:position + 2] == b"BC":
+            return int.from_bytes(data[position + 4:position + 6], "little") + 1
+        position += 4 + subfield_length
+    raise ValueError(f"Invalid bgzf block at byte {offset}, the gzip header has no BC subfield")
+
+
+def _inflate_bgzf_block(data, offset: int, block_size: int):
+    extra_length = int.from_bytes(data[offset + 10:offset + 12], "little")
+    return zlib.decompress(data[offset + 12 + extra_length:offset + block_size - 8], -15)
+
+
+def iter_bgzf_blocks(data):
+    """yield the compressed offset and the decompressed content of every block of a bgzf file held in data"""
+    offset = 0
+    while offset < len(data):
+        block_size = _bgzf_block_size(data, offset)
+        yield offset, _inflate_bgzf_block(data, offset, block_size)
+        offset += block_size
+
+
+def _is_gzip(data):
+    return data[:2] == b"\x1f\x8b"
+
+
+class AlphaMissenseIndex:
+    """
+    class for the byte offset index of the protein blocks of an alphamissense tabulated file, plain or compressed with bgzip
+    offsets and lengths address the uncompressed content, blocks maps the compressed offset of every bgzf block to the uncompressed offset it starts at
+    the index keeps the size and modification time of the file it was built from and refuses to read a file that changed since
+    """
+    def __init__(self, file_path: str, accessions, offsets, lengths, blocks, file_size: int, file_mtime: int):
+        self.file_path = file_path
+        self.accessions = accessions
+        self.offsets = offsets
+        self.lengths = lengths
+        self.blocks = blocks
+        self.file_size = file_size
+        self.file_mtime = file_mtime
+        self.positions = {}
+        for i, accession in enumerate(accessions):
+            self.positions.setdefault(accession, []).append(i)
+
+    @classmethod
+    def build(cls, file_path: str):
+        """scan the whole file once and index the byte range of every contiguous block of lines of the same protein"""
+        stat = os.stat(file_path)
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            blocks = []
+            # gzip files are only accepted when they are made of bgzf blocks
+            if _is_gzip(data):
+                chunks = cls._iter_bgzf_chunks(data, blocks)
+            else:
+                chunks = ((offset, data[offset:offset + INDEX_CHUNK_SIZE]) for offset in range(0, len(data), INDEX_CHUNK_SIZE))
+            accessions, offsets, total = cls._scan_protein_blocks(chunks)
+        offsets = np.array(offsets, dtype=np.int64)
+        lengths = np.diff(np.append(offsets, total))
+        return cls(file_path, accessions, offsets, lengths, np.array(blocks, dtype=np.int64).reshape(-1, 2), stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _iter_bgzf_chunks(data, blocks: list):
+        """yield the decompressed content of a bgzf file in chunks of about INDEX_CHUNK_SIZE bytes while recording its block table in blocks"""
+        chunk = []
+        chunk_size = 0
+        chunk_offset = 0
+        uncompressed_offset = 0
+        for compressed_offset, content in iter_bgzf_blocks(data):
+            blocks.append((compressed_offset, uncompressed_offset))
+            uncompressed_offset += len(content)
+            chunk.append(content)
+            chunk_size += len(content)
+            if chunk_size >= INDEX_CHUNK_SIZE:
+                yield chunk_offset, b"".join(chunk)
+                chunk_offset += chunk_size
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            yield chunk_offset, b"".join(chunk)
+
+    @staticmethod
+    def _scan_protein_blocks(chunks):
+        """
+        find the offset of every line that starts a new protein, header and comment lines are skipped
+        the accession of each line is compared as a fixed width window of its first bytes masked after the first tab so the scan runs on whole chunks at once
+        return the accessions and offsets of the blocks and the total uncompressed size
+        """
+        accessions = []
+        offsets = []
+        columns = np.arange(ACCESSION_WINDOW)
+        previous = None
+
+        def scan(lines: bytes, base: int):
+            nonlocal previous
+            array = np.frombuffer(lines, dtype=np.uint8)
+            starts = np.concatenate(([0], np.flatnonzero(array == 10)[:-1] + 1))
+            # the header of the file is a few comment lines followed by the column names
+            while len(starts) and (lines[starts[0]:starts[0] + 1] == b"#" or lines[starts[0]:starts[0] + 11] == b"uniprot_id\t"):
+                starts = starts[1:]
+            if not len(starts):
+                return
+            window = np.concatenate((array, np.zeros(ACCESSION_WINDOW, dtype=np.uint8)))[starts[:, None] + columns]
+            tabs = np.argmax(window == 9, axis=1)
+            if not (window[np.arange(len(starts)), tabs] == 9).all():
+                raise ValueError(f"Found a line without an accession of at most {ACCESSION_WINDOW - 1} characters followed by a tab")
+            keys = np.where(columns <= tabs[:, None], window, 0)
+            new_block = np.concatenate(([True], (keys[1:] != keys[:-1]).any(axis=1)))
+            if previous is not None and (keys[0] == previous).all():
+                new_block[0] = False
+            previous = keys[-1]
+            for i in np.flatnonzero(new_block):
+                accessions.append(lines[starts[i]:starts[i] + tabs[i]].decode())
+                offsets.append(base + int(starts[i]))
+
+        remainder = b""
+        remainder_offset = 0
+        total = 0
+        for chunk_offset, chunk in chunks:
+            total = chunk_offset + len(chunk)
+            data = remainder + chunk
+            end = data.rfind(b"\n") + 1
+            if end:
+                scan(data[:end], remainder_offset)
+            remainder = data[end:]
+            remainder_offset += end
+        if remainder.strip():
+            scan(remainder + b"\n", remainder_offset)
+        return accessions, offsets, total
+
+    def save(self, index_path: str = None):
+        np.savez(
+            index_path or default_index_path(self.file_path),
+            accessions=np.array(self.accessions, dtype=str),
+            offsets=self.offsets,
+            lengths=self.lengths,
+            blocks=self.blocks,
+            file_size=self.file_size,
+            file_mtime=self.file_mtime,
+        )
+
+    @classmethod
+    def load(cls, file_path: str, index_path: str = None):
+        """load the saved index of file_path, raise ValueError if the file changed since the index was built"""
+        with np.load(index_path or default_index_path(file_path)) as saved:
+            index = cls(
+                file_path, saved["accessions"].tolist(), saved["offsets"], saved["lengths"], saved["blocks"],
+                int(saved["file_size"]), int(saved["file_mtime"]),
+            )
+        if not index.is_current():
+            raise ValueError(f"The index of {file_path} is stale, the file changed since the index was built")
+        return index
+
+    @classmethod
+    def open(cls, file_path: str, index_path: str = None):
+        """load the saved index of file_path, building and saving it first when it is missing or stale"""
+        try:
+            return cls.load(file_path, index_path)
+        except (FileNotFoundError, ValueError):
+            index = cls.build(file_path)
+            index.save(index_path)
+            return index
+
+    def is_current(self):
+        stat = os.stat(self.file_path)
+        return stat.st_size == self.file_size and stat.st_mtime_ns == self.file_mtime
+
+    def read(self, accessions):
+        """return the raw tabulated lines of the given accessions in the order of accessions, unknown accessions are skipped"""
+        if not self.is_current():
+            raise ValueError(f"The index of {self.file_path} is stale, the file changed since the index was built")
+        ranges = [(int(self.offsets[i]), int(self.lengths[i])) for accession in accessions for i in self.positions.get(accession, [])]
+        with open(self.file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if not len(self.blocks):
+                pieces = [data[offset:offset + length] for offset, length in ranges]
+            else:
+                pieces = [self._read_bgzf(data, offset, length) for offset, length in ranges]
+        # the last block of a file that does not end with a newline would otherwise run into the next one
+        return b"".join(piece if piece.endswith(b"\n") else piece + b"\n" for piece in pieces)
+
+    def _read_bgzf(self, data, offset: int, length: int):
+        """decompress only the bgzf blocks holding the uncompressed byte range of length bytes starting at offset"""
+        uncompressed_offsets = self.blocks[:, 1]
+        i = int(np.searchsorted(uncompressed_offsets, offset, side="right")) - 1
+        content = []
+        skip = offset - int(uncompressed_offsets[i])
+        remaining = length + skip
+        while remaining > 0:
+            compressed_offset = int(self.blocks[i, 0])
+            block = _inflate_bgzf_block(data, compressed_offset, _bgzf_block_size(data, compressed_offset))
+            content.append(block)
+            remaining -= len(block)
+            i += 1
+        return b"".join(content)[skip:skip + length]
+
+    def read_dataframe(self, accessions):
+        """return the alphamissense rows of the given accessions as a dataframe with the ALPHAMISSENSE_COLUMNS"""
+        content = self.read(accessions)
+        if not content:
+            return pd.DataFrame(columns=ALPHAMISSENSE_COLUMNS)
+        return pd.read_csv(
+            io.BytesIO(content), sep="\t", header=None, names=ALPHAMISSENSE_COLUMNS,
+            dtype={"UniprotID": str, "Variant": str, "Score": float, "Pathogenicity": str},
+        )
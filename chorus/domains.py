@@ -0,0 +1,72 @@
+import pandas as pd
+from django.db.models import Exists, OuterRef
+
+from chorus.models import DomainSource, Protein, ProteinDomain, UniprotEntry
+from chorus.utils import extract_functional_domains
+
+# columns of a curated domain file, accession is the protein name
+CURATED_DOMAIN_COLUMNS = ["accession", "domain", "start", "end"]
+
+
+def build_uniprot_domains(protein_ids, using: str):
+    """
+    derive the domains of the proteins from their entries in the uniprot snapshot and replace their stored uniprot domains
+    return the number of domains stored, proteins without a snapshot entry are left without uniprot domains
+    the caller bumps the dataset version once its transaction holds all of its changes
+    """
+    protein_ids = list(protein_ids)
+    names = dict(Protein.objects.using(using).filter(id__in=protein_ids).values_list("name", "id"))
+    entries = pd.DataFrame(
+        list(UniprotEntry.objects.using(using).filter(accession__in=list(names)).values_list("accession", "domain", "sequence")),
+        columns=["Entry", "Domain [FT]", "Sequence"],
+    )
+    table = extract_functional_domains(entries, "Domain [FT]")
+    table = table[table["start"].notna() & table["end"].notna()]
+    domains = [
+        ProteinDomain(protein_id=names[accession], domain=domain, start=int(start), end=int(end), source=DomainSource.UNIPROT)
+        for accession, domain, start, end in zip(table["accession"], table["domain"], table["start"], table["end"])
+    ]
+    ProteinDomain.objects.using(using).filter(protein_id__in=protein_ids, source=DomainSource.UNIPROT).delete()
+    ProteinDomain.objects.using(using).bulk_create(domains)
+    return len(domains)
+
+
+def load_curated_domains(df: pd.DataFrame, using: str):
+    """
+    replace the curated domains of the proteins listed in df, a dataframe with the CURATED_DOMAIN_COLUMNS
+    return the accessions of df that do not match any protein, their rows are skipped
+    the caller bumps the dataset version once its transaction holds all of its changes
+    """
+    names = dict(Protein.objects.using(using).filter(name__in=df["accession"].unique().tolist()).values_list("name", "id"))
+    known = df["accession"].isin(names)
+    domains = [
+        ProteinDomain(protein_id=names[accession], domain=domain, start=int(start), end=int(end), source=DomainSource.CURATED)
+        for accession, domain, start, end in zip(df["accession"][known], df["domain"][known], df["start"][known], df["end"][known])
+    ]
+    ProteinDomain.objects.using(using).filter(protein_id__in=list(names.values()), source=DomainSource.CURATED).delete()
+    ProteinDomain.objects.using(using).bulk_create(domains)
+    return sorted(set(df["accession"][~known]))
+
+
+def locate_domains(items, using: str):
+    """
+    find the effective domains containing each (protein name, position) pair of items with a single query
+    return one list of domain dictionaries per item in the order of items
+    """
+    rows = ProteinDomain.objects.using(using).effective().filter(protein__name__in={name for name, _ in items}).values_list(
+        "protein__name", "domain", "start", "end", "source"
+    )
+    protein_domains = {}
+    for name, domain, start, end, source in rows:
+        protein_domains.setdefault(name, []).append((domain, start, end, source))
+    return [[
+        {"domain": domain, "start": start, "end": end, "source": source}
+        for domain, start, end, source in protein_domains.get(name, []) if start <= position <= end
+    ] for name, position in items]
+
+
+def in_domain(domain: str):
+    """condition keeping the variants located inside an effective domain named domain of their own protein"""
+    return Exists(ProteinDomain.objects.effective().filter(
+        protein_id=OuterRef("protein_id"), domain=domain, start__lte=OuterRef("position"), end__gte=OuterRef("position")
+    ))
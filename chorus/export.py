@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from chorus.models import Pathogenicity
+
+# columns of an exported variant, protein is the protein name and pathogenicity the class name like in the variant api
+VARIANT_EXPORT_COLUMNS = ["id", "protein", "position", "original", "mutated", "score", "pathogenicity"]
+VARIANT_EXPORT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("protein", pa.string()),
+    ("position", pa.int32()),
+    ("original", pa.string()),
+    ("mutated", pa.string()),
+    ("score", pa.float32()),
+    ("pathogenicity", pa.dictionary(pa.int8(), pa.string())),
+])
+# number of rows fetched from the database cursor and written out at once
+EXPORT_CHUNK_SIZE = 10000
+
+
+def variant_export_rows(queryset):
+    """fetch the VARIANT_EXPORT_COLUMNS of the variants through a server side cursor where the database has one, so the rows are never held in memory at once"""
+    labels = dict(Pathogenicity.choices)
+    rows = queryset.values_list("id", "protein__name", "position", "original", "mutated", "score", "pathogenicity").iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for id, protein, position, original, mutated, score, pathogenicity in rows:
+        yield id, protein, position, original, mutated, score, labels[pathogenicity]
+
+
+def _chunked(rows, size: int = EXPORT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(rows):
+    """yield the header and then the rows as csv text, one piece per chunk of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(VARIANT_EXPORT_COLUMNS)
+    for chunk in _chunked(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    """yield one json object per row and per line, one piece per chunk of rows"""
+    for chunk in _chunked(rows):
+        yield "".join(json.dumps(dict(zip(VARIANT_EXPORT_COLUMNS, row))) + "\n" for row in chunk)
+
+
+class _StreamSink:
+    """write only file object collecting what a writer wrote since it was last drained"""
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_parquet(rows):
+    """yield a parquet file of VARIANT_EXPORT_SCHEMA, every chunk of rows becomes a row group sent as soon as it is written"""
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, VARIANT_EXPORT_SCHEMA, compression="zstd")
+    for chunk in _chunked(rows):
+        columns = list(zip(*chunk))
+        writer.write_table(pa.table([pa.array(column, type=field.type) for column, field in zip(columns, VARIANT_EXPORT_SCHEMA)], schema=VARIANT_EXPORT_SCHEMA))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# content type, file extension and writer of every export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv", iter_csv),
+    "ndjson": ("application/x-ndjson", "ndjson", iter_ndjson),
+    "parquet": ("application/vnd.apache.parquet", "parquet", iter_parquet),
+}
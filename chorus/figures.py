@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# colors of the alphamissense pathogenicity classes and of the MDSGene classifications
+COLOR_DISCRETE_MAP = {
+    "pathogenic": "#ff5671",
+    "ambiguous": "#ffc955",
+    "benign": "#4e804e",
+    "MDSGene - probable pathogenic": "#4a54db",
+    "MDSGene - possibly pathogenic": "#29eeed",
+    "MDSGene - clearly pathogenic mutations": "#bc64ff",
+}
+# spacing of the vertical guide lines in residues
+GUIDE_LINE_SPACING = 50
+# render modes of the score figure, auto draws with svg up to WEBGL_POINT_THRESHOLD points and with webgl above
+# overview replaces the faded points of the variants only in alphamissense by per position min, mean and max score bands, the points of a visible range can then be loaded from the api
+RENDER_MODES = ("auto", "svg", "webgl", "overview")
+WEBGL_POINT_THRESHOLD = 5000
+SCORE_BAND_COLUMNS = ["position", "min", "mean", "max"]
+
+
+def annotation_hover_text(df: pd.DataFrame, exclude=("Original", "Mutated")):
+    """build the hover text of every annotated variant from its non missing columns in the form of column: value joined by <br>"""
+    text = pd.Series(None, index=df.index, dtype=object)
+    for column in df.columns:
+        if column in exclude:
+            continue
+        present = df[column].notna()
+        part = f"{column}: " + df[column].astype(str)
+        text = text.where(~present, part.where(text.isna(), text + "<br>" + part))
+    return text
+
+
+# axis references of the domain panel (row 1) and the score panel (row 2) of the two row figures made by make_subplots
+_panel_axes = {1: ("x", "y"), 2: ("x2", "y2")}
+
+
+def _score_text(df: pd.DataFrame):
+    return "Score: " + df["Score"].map("{: .2f}".format).astype(str) + "<br>" + "Alphamissense: " + df["Pathogenicity"]
+
+
+def build_traces(df: pd.DataFrame, color_map: dict):
+    """
+    build the traces of the score figure from whole columns at once, every trace holds the rows of its points with their hover text, its opacity and its color
+    every pathogenicity class gets a trace of its annotated variants and a faded trace of the variants only in alphamissense, every MDSGene classification gets a trace of its variants
+    return the traces by name along with the opacity of the points of the annotated trace of every class for each ClinVar clinical significance of the dropdown
+    """
+    traces = {}
+    dropdown_option = {k: {} for k in df["ClinVar Clinical Significance"].unique()}
+    dropdown_option["All (ClinVar)"] = {}
+    df = df.sort_values("Pathogenicity", kind="stable")
+    annotated = df["hover_text"].notna().to_numpy()
+
+    with_annotations = df[annotated]
+    with_annotations = with_annotations.assign(text=with_annotations["hover_text"] + "<br>" + _score_text(with_annotations))
+    only_alphamissense = df[~annotated]
+    only_alphamissense = only_alphamissense.assign(
+        text="Position: " + only_alphamissense["Position"].astype(str) + "<br>Variant: " + only_alphamissense["Variant"] + "<br>" + _score_text(only_alphamissense)
+    )
+    for i in df["Pathogenicity"].unique():
+        g = with_annotations[with_annotations["Pathogenicity"] == i]
+        traces[i] = {"data": g, "opacity": 1, "color": color_map[i], "skip": False}
+        traces[i + " only in Alphamissense"] = {"data": only_alphamissense[only_alphamissense["Pathogenicity"] == i], "opacity": 0.05, "color": color_map[i], "skip": True}
+        for clinical_path in dropdown_option:
+            if clinical_path == "All (ClinVar)":
+                dropdown_option[clinical_path][i] = np.ones(g.shape[0], dtype=int)
+            else:
+                dropdown_option[clinical_path][i] = (g["ClinVar Clinical Significance"] == clinical_path).to_numpy().astype(int)
+
+    classified = with_annotations[with_annotations["classification"] != ""]
+    for classification, g in classified.groupby("classification", sort=False):
+        name = f"MDSGene - {classification}"
+        traces[name] = {"data": g, "opacity": 1, "color": color_map[name], "skip": False}
+    return traces, dropdown_option
+
+
+def scatter_class(points: int, render_mode: str = "auto"):
+    """return the plotly scatter class used to draw a figure of that many points, webgl is used above WEBGL_POINT_THRESHOLD points in auto and overview mode"""
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode {render_mode}, expected one of {', '.join(RENDER_MODES)}")
+    if render_mode == "webgl" or (render_mode in ("auto", "overview") and points > WEBGL_POINT_THRESHOLD):
+        return go.Scattergl
+    return go.Scatter
+
+
+def score_bands(df: pd.DataFrame):
+    """return the minimum, mean and maximum score of every position of the variants of a protein with the SCORE_BAND_COLUMNS"""
+    bands = df.groupby("Position")["Score"].agg(["min", "mean", "max"]).reset_index()
+    return bands.rename(columns={"Position": "position"})[SCORE_BAND_COLUMNS]
+
+
+def add_score_bands(fig, bands: pd.DataFrame, row: int = 2):
+    """draw the range between the minimum and maximum score of every position as a filled band and the mean score as a line"""
+    line = dict(color="DarkSlateGrey", width=0)
+    fig.add_trace(go.Scatter(
+        x=bands["position"].to_numpy(), y=bands["max"].to_numpy(), mode="lines", line=line, hoverinfo="skip", showlegend=False, name="Maximum score",
+    ), row=row, col=1)
+    fig.add_trace(go.Scatter(
+        x=bands["position"].to_numpy(), y=bands["min"].to_numpy(), mode="lines", line=line, fill="tonexty", fillcolor="rgba(47, 79, 79, 0.2)",
+        hoverinfo="skip", name="Score range",
+    ), row=row, col=1)
+    fig.add_trace(go.Scatter(
+        x=bands["position"].to_numpy(), y=bands["mean"].to_numpy(), mode="lines", line=dict(color="DarkSlateGrey", width=1),
+        hovertemplate="Position: %{x}<br>Mean score: %{y:.2f}<extra></extra>", name="Mean score",
+    ), row=row, col=1)
+
+
+def build_variant_figure(df: pd.DataFrame, sequence_length: int, domains, color_map: dict = None, render_mode: str = "auto"):
+    """
+    build the alphamissense score figure of a protein from its variants merged with the gnomAD and MDSGene annotations
+    df needs the Position, Variant, Score and Pathogenicity columns and the hover_text, ClinVar Clinical Significance and classification columns of the annotations, missing for the variants only in alphamissense
+    domains is the list of domain dictionaries drawn in the top panel, render_mode is one of RENDER_MODES
+    """
+    color_map = color_map or COLOR_DISCRETE_MAP
+    traces, dropdown_option = build_traces(df, color_map)
+    if render_mode == "overview":
+        traces = {k: trace for k, trace in traces.items() if not trace["skip"]}
+    scatter = scatter_class(sum(trace["data"].shape[0] for trace in traces.values()), render_mode)
+
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.2, 0.8], vertical_spacing=0.02, shared_xaxes=True)
+    for k in sorted(traces, reverse=True):
+        trace = traces[k]
+        data = trace["data"]
+        marker = dict(color=trace["color"], opacity=np.full(data.shape[0], trace["opacity"]), size=10)
+        if not trace["skip"]:
+            marker["line"] = dict(width=2, color='DarkSlateGrey')
+        fig.add_trace(scatter(
+            x=data["Position"].to_numpy(),
+            y=data["Score"].to_numpy(),
+            text=data["text"].to_numpy(),
+            mode="markers",
+            marker=marker,
+            hoverinfo="skip" if trace["skip"] else "text",
+            name=k,
+        ), row=2, col=1)
+
+    buttons = []
+    for k in ["All (ClinVar)"] + [k for k in dropdown_option if k != "All (ClinVar)"]:
+        args = [{"marker.opacity": []}, []]
+        for j in range(len(fig.data)):
+            if fig.data[j]["name"] in dropdown_option[k]:
+                args[0]["marker.opacity"].append(dropdown_option[k][fig.data[j]["name"]])
+                args[1].append(j)
+        buttons.append(dict(label=k, method="restyle", args=args))
+
+    if render_mode == "overview":
+        add_score_bands(fig, score_bands(df))
+    add_domain_panel(fig, sequence_length, domains)
+    # the dropdown is left out when none of the annotated variants has a ClinVar clinical significance to filter on
+    clinical_significance = df.loc[df["hover_text"].notna(), "ClinVar Clinical Significance"]
+    updatemenus = []
+    if (clinical_significance.notna() & (clinical_significance != "")).any():
+        updatemenus.append({
+            "active": 0,
+            "buttons": buttons,
+            "direction": "down",
+            "y": 1,
+        })
+    fig.update_layout(
+        template="ggplot2",
+        legend_title_text="Alphamissense Pathogenicity",
+        updatemenus=updatemenus,
+    )
+    fig.update_xaxes(showgrid=False, zeroline=False, range=[1, sequence_length])
+    fig.update_yaxes(showgrid=False, zeroline=False, range=[0, 1])
+    fig.update_yaxes(showticklabels=False, row=1, col=1)
+    return fig
+
+
+def add_domain_panel(fig, sequence_length: int, domains):
+    """draw the guide lines on both panels and the domain boxes with their labels on the top panel of a two row figure"""
+    shapes = []
+    annotations = []
+    line = dict(color="black", width=1)
+    for i in range(0, sequence_length + 1, GUIDE_LINE_SPACING):
+        for panel in (2, 1):
+            xref, yref = _panel_axes[panel]
+            shapes.append(dict(type="line", xref=xref, yref=yref, x0=i, y0=0, x1=i, y1=1, line=line, layer="below"))
+    label = dict(y=0.5, showarrow=False, yshift=10, font=dict(size=16, color="black"), align="center", xref="x", yref="y")
+    if len(domains) > 0:
+        for d in domains:
+            for panel in (2, 1):
+                xref, yref = _panel_axes[panel]
+                shapes.append(dict(
+                    type="rect", xref=xref, yref=yref, x0=d["start"], y0=0, x1=d["end"], y1=1,
+                    fillcolor="#fdfffb", line=dict(color="black", width=3), opacity=0.5, layer="below"
+                ))
+            annotations.append(dict(text=f"{d['domain']}<br>{d['start']}-{d['end']}", x=(d["start"] + d["end"]) / 2, **label))
+    else:
+        annotations.append(dict(text="No domain data", x=sequence_length / 2, **label))
+    # set at once, adding the shapes one by one validates the whole layout every time
+    fig.update_layout(shapes=list(fig.layout.shapes) + shapes, annotations=list(fig.layout.annotations) + annotations)
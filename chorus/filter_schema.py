@@ -1,6 +1,21 @@
 import six
 from filters.schema import base_query_params_schema
 from filters.validations import IntegerLike
+from voluptuous import Invalid
+
+
+def FloatLike(msg=None):
+    """
+    Checks whether a value is a number or a str that can be converted to a float
+    """
+    def fn(value):
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            raise Invalid(msg or f"Invalid input <{value}>; expected a number")
+        return value
+    return fn
+
 
 protein_query_schema = base_query_params_schema.extend(
     {
@@ -14,9 +29,24 @@ variant_query_schema = base_query_params_schema.extend(
         "id": IntegerLike(),
         "protein": six.text_type,
         "position": IntegerLike(),
+        "position_start": IntegerLike(),
+        "position_end": IntegerLike(),
         "original": six.text_type,
         "mutated": six.text_type,
         "pathogenicity": six.text_type,
+        "score_min": FloatLike(),
+        "score_max": FloatLike(),
+        "domain": six.text_type,
+    }
+)
+
+protein_domain_query_schema = base_query_params_schema.extend(
+    {
+        "id": IntegerLike(),
+        "protein": six.text_type,
+        "domain": six.text_type,
+        "source": six.text_type,
+        "position": IntegerLike(),
     }
 )
 
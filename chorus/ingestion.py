@@ -0,0 +1,365 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from django.db import connections, router, transaction
+
+from chorus.domains import build_uniprot_domains
+from chorus.matrix import build_variant_matrix
+from chorus.models import IngestCheckpoint, Protein, ProteinSummary, ProteinVariantMatrix, Variant, PATHOGENICITY_CODES
+from chorus.statistics import build_protein_summary
+from chorus.utils import VARIANT_REGEX
+from chorus.versioning import VARIANT_DATASET, VARIANT_SCORES_DATASET, bump_dataset_version
+
+# the alphamissense tabulated file starts with 3 lines of copyright comments followed by the column header
+ALPHAMISSENSE_HEADER_LINES = 4
+ALPHAMISSENSE_COLUMNS = ["uniprot_id", "protein_variant", "am_pathogenicity", "am_class"]
+# parsed lines of the alphamissense file, pathogenicity holds the Pathogenicity codes
+ALPHAMISSENSE_BLOCK_SCHEMA = pa.schema([
+    ("protein", pa.string()),
+    ("position", pa.int32()),
+    ("original", pa.string()),
+    ("mutated", pa.string()),
+    ("score", pa.float64()),
+    ("pathogenicity", pa.int8()),
+])
+
+
+def parse_alphamissense_block(block: bytes):
+    """
+    parse whole lines of the alphamissense tabulated file in one pass into a pyarrow table of ALPHAMISSENSE_BLOCK_SCHEMA
+    lines without a variant in the form of A123B or with another number of columns than the first line are dropped
+    """
+    first_line = block[:block.find(b"\n")]
+    columns = first_line.count(b"\t") + 1
+    if not block.strip() or columns < len(ALPHAMISSENSE_COLUMNS):
+        return ALPHAMISSENSE_BLOCK_SCHEMA.empty_table()
+    names = ALPHAMISSENSE_COLUMNS + [f"column_{i}" for i in range(len(ALPHAMISSENSE_COLUMNS), columns)]
+    table = pa_csv.read_csv(
+        pa.py_buffer(block),
+        read_options=pa_csv.ReadOptions(column_names=names),
+        parse_options=pa_csv.ParseOptions(delimiter="\t", quote_char=False, invalid_row_handler=lambda row: "skip"),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=ALPHAMISSENSE_COLUMNS,
+            column_types={"uniprot_id": pa.string(), "protein_variant": pa.string(), "am_pathogenicity": pa.float64(), "am_class": pa.string()},
+        ),
+    )
+    variants = pc.extract_regex(table["protein_variant"], VARIANT_REGEX)
+    found = pc.is_valid(variants)
+    table = table.filter(found)
+    variants = variants.filter(found)
+    classes = pc.dictionary_encode(table["am_class"]).combine_chunks()
+    try:
+        codes = np.array([PATHOGENICITY_CODES[name] for name in classes.dictionary.to_pylist()], dtype=np.int8)
+    except KeyError as e:
+        raise ValueError(f"Unknown alphamissense class {e.args[0]}")
+    return pa.table([
+        table["uniprot_id"],
+        pc.cast(pc.struct_field(variants, "Position"), pa.int32()),
+        pc.struct_field(variants, "Original"),
+        pc.struct_field(variants, "Mutated"),
+        table["am_pathogenicity"],
+        pa.array(codes[classes.indices.to_numpy(zero_copy_only=False)], type=pa.int8()),
+    ], schema=ALPHAMISSENSE_BLOCK_SCHEMA)
+
+
+def iter_alphamissense_blocks(f, batch_size: int, start: int, end: int, read_size: int = 16 << 20):
+    """
+    read the lines of an alphamissense file opened in binary mode between the byte offsets start and end in blocks of batch_size lines
+    yield each block along with the byte offset of the first line that is not part of it
+    """
+    f.seek(start)
+    offset = start
+    pending = b""
+    # positions in pending of the newlines that are not part of a yielded block yet, each read is only scanned once
+    newlines = np.empty(0, dtype=np.int64)
+    while offset < end:
+        data = f.read(min(read_size, end - offset - len(pending)))
+        newlines = np.concatenate([newlines, np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")) + len(pending)])
+        pending += data
+        at_end = not data or offset + len(pending) >= end
+        cut = 0
+        used = 0
+        while cut < len(pending):
+            if len(newlines) - used >= batch_size:
+                used += batch_size
+                next_cut = int(newlines[used - 1]) + 1
+            elif at_end:
+                next_cut = len(pending)
+            else:
+                break
+            offset += next_cut - cut
+            yield pending[cut:next_cut], offset
+            cut = next_cut
+        pending = pending[cut:]
+        newlines = newlines[used:] - cut
+        if at_end:
+            break
+
+
+def skip_alphamissense_header(f):
+    """skip the header lines of an alphamissense file opened in binary mode and return the byte offset of the first data line"""
+    offset = 0
+    for _ in range(ALPHAMISSENSE_HEADER_LINES):
+        offset += len(f.readline())
+    return offset
+
+
+def next_protein_boundary(f, offset: int, file_size: int):
+    """return the byte offset of the first line after offset that belongs to a different protein than the line before it"""
+    f.seek(offset)
+    f.readline()
+    previous_protein = None
+    while True:
+        position = f.tell()
+        line = f.readline()
+        if not line:
+            return file_size
+        protein_name = line.split(b"\t", 1)[0]
+        if previous_protein is not None and protein_name != previous_protein:
+            return position
+        previous_protein = protein_name
+
+
+def split_alphamissense_file(file_path: str, shards: int):
+    """split the data lines of an alphamissense file into at most shards byte ranges, each of them starting and ending on a protein boundary"""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        data_start = skip_alphamissense_header(f)
+        boundaries = [data_start]
+        shard_size = (file_size - data_start) // shards
+        for i in range(1, shards):
+            boundary = next_protein_boundary(f, data_start + shard_size * i, file_size)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < file_size:
+        boundaries.append(file_size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)]
+
+
+def create_ingest_checkpoints(file_path: str, shards: int, using: str = None):
+    """split an alphamissense file into shards and store one checkpoint per shard"""
+    using = using or router.db_for_write(IngestCheckpoint)
+    source = os.path.abspath(file_path)
+    file_size = os.path.getsize(source)
+    return IngestCheckpoint.objects.using(using).bulk_create([
+        IngestCheckpoint(source=source, file_size=file_size, shard=i, start_offset=start, end_offset=end, offset=start, completed=start >= end)
+        for i, (start, end) in enumerate(split_alphamissense_file(source, shards))
+    ])
+
+
+def load_alphamissense_shard(checkpoint_id: int, batch_size: int, method: str = "auto", progress=None):
+    """
+    load the part of a shard that comes after its checkpoint, the checkpoint is moved forward in the same transaction as every written batch
+    progress is an optional callable receiving the number of variants written so far
+    return the number of variants written and the ids of the proteins they belong to
+    """
+    writer = VariantBulkWriter(method=method)
+    checkpoint = IngestCheckpoint.objects.using(writer.using).get(id=checkpoint_id)
+    total = 0
+    protein_ids = set()
+    with open(checkpoint.source, "rb") as f:
+        for block, offset in iter_alphamissense_blocks(f, batch_size, checkpoint.offset, checkpoint.end_offset):
+            table = parse_alphamissense_block(block)
+            checkpoint.offset = offset
+            if len(table):
+                checkpoint.protein = table["protein"][-1].as_py()
+            checkpoint.completed = offset >= checkpoint.end_offset
+            total += writer.write(table, checkpoint)
+            protein_ids.update(writer.protein_ids)
+            if progress:
+                progress(total)
+    if not checkpoint.completed:
+        checkpoint.completed = True
+        checkpoint.save(using=writer.using)
+    return total, protein_ids
+
+
+def materialize_proteins(protein_variants: dict, using: str):
+    """
+    compute and store the variant matrices and summaries of proteins from all of their variants along with their uniprot domains
+    protein_variants is a dictionary of protein id to a list of (position, original, mutated, score, pathogenicity) tuples
+    the caller bumps the dataset versions once its transaction holds all of its changes
+    """
+    matrices = []
+    summaries = []
+    for protein_id, variants in protein_variants.items():
+        positions, originals, mutated, scores, pathogenicity = zip(*variants)
+        length, reference, score_matrix, pathogenicity_matrix = build_variant_matrix(positions, originals, mutated, scores, pathogenicity)
+        matrices.append(ProteinVariantMatrix(
+            protein_id=protein_id,
+            length=length,
+            reference=reference,
+            scores=score_matrix.tobytes(),
+            pathogenicity=pathogenicity_matrix.tobytes(),
+        ))
+        summaries.append(ProteinSummary(protein_id=protein_id, **build_protein_summary(positions, scores, pathogenicity)))
+    ProteinVariantMatrix.objects.using(using).filter(protein_id__in=list(protein_variants)).delete()
+    ProteinVariantMatrix.objects.using(using).bulk_create(matrices)
+    ProteinSummary.objects.using(using).filter(protein_id__in=list(protein_variants)).delete()
+    ProteinSummary.objects.using(using).bulk_create(summaries)
+    build_uniprot_domains(protein_variants, using)
+
+
+def materialize_protein_ids(protein_ids, using: str = None):
+    """
+    rebuild the precomputed data of the proteins from the variants already stored in the database in a single transaction
+    return the number of proteins rebuilt, proteins without variants are skipped
+    """
+    using = using or router.db_for_write(Variant)
+    protein_variants = {}
+    variants = Variant.objects.using(using).filter(protein_id__in=list(protein_ids)).order_by().values_list(
+        "protein_id", "position", "original", "mutated", "score", "pathogenicity"
+    )
+    for data in variants.iterator(chunk_size=100000):
+        protein_variants.setdefault(data[0], []).append(data[1:])
+    with transaction.atomic(using=using):
+        materialize_proteins(protein_variants, using)
+        bump_dataset_version(VARIANT_DATASET, using=using)
+        # the score store is exported from the matrices, a store exported before they were rebuilt is no longer current
+        bump_dataset_version(VARIANT_SCORES_DATASET, using=using)
+    return len(protein_variants)
+
+
+def materialize_protein_batches(protein_ids, batch_size: int = 100, workers: int = 1, progress=None):
+    """
+    rebuild the precomputed data of the proteins batch_size proteins per transaction, spread over worker processes when workers is above 1
+    progress is an optional callable receiving the number of proteins processed so far
+    """
+    protein_ids = sorted(protein_ids)
+    batches = [protein_ids[i:i + batch_size] for i in range(0, len(protein_ids), batch_size)]
+    done = 0
+    if workers == 1:
+        for batch in batches:
+            materialize_protein_ids(batch)
+            done += len(batch)
+            if progress:
+                progress(done)
+        return
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        futures = {executor.submit(materialize_protein_ids, batch): len(batch) for batch in batches}
+        for future in as_completed(futures):
+            future.result()
+            done += futures[future]
+            if progress:
+                progress(done)
+
+
+def alphamissense_protein_names(file_path: str):
+    """return the set of protein names of an alphamissense file, only the first column of the file is parsed"""
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(skip_rows=ALPHAMISSENSE_HEADER_LINES, autogenerate_column_names=True, block_size=16 << 20),
+        parse_options=pa_csv.ParseOptions(delimiter="\t", quote_char=False, invalid_row_handler=lambda row: "skip"),
+        convert_options=pa_csv.ConvertOptions(include_columns=["f0"], column_types={"f0": pa.string()}),
+    )
+    names = set()
+    for batch in reader:
+        names.update(pc.unique(batch.column(0)).to_pylist())
+    return names
+
+
+def delete_protein_variants(protein_names, using: str = None, chunk_size: int = 500):
+    """
+    delete the variants of the proteins in protein_names along with their precomputed data in a single transaction so they can be loaded again
+    the proteins themselves are kept, return the number of variants deleted
+    """
+    using = using or router.db_for_write(Variant)
+    protein_ids = list(Protein.objects.using(using).filter(name__in=list(protein_names)).values_list("id", flat=True))
+    deleted = 0
+    with transaction.atomic(using=using):
+        for i in range(0, len(protein_ids), chunk_size):
+            chunk = protein_ids[i:i + chunk_size]
+            deleted += Variant.objects.using(using).filter(protein_id__in=chunk).delete()[0]
+            ProteinVariantMatrix.objects.using(using).filter(protein_id__in=chunk).delete()
+            ProteinSummary.objects.using(using).filter(protein_id__in=chunk).delete()
+        if deleted:
+            bump_dataset_version(VARIANT_DATASET, using=using)
+            bump_dataset_version(VARIANT_SCORES_DATASET, using=using)
+    return deleted
+
+
+class ProteinNameCache:
+    """
+    class for keeping an in memory dictionary of protein name to protein id during ingestion
+    all existing proteins are fetched once and proteins that are not known yet are created in bulk
+    """
+    def __init__(self, using: str):
+        self.using = using
+        self.ids = dict(Protein.objects.using(using).values_list("name", "id"))
+
+    def resolve(self, names):
+        """return the dictionary of protein name to protein id after creating the proteins in names that do not exist yet"""
+        missing = [name for name in names if name not in self.ids]
+        if missing:
+            Protein.objects.using(self.using).bulk_create([Protein(name=name, description="") for name in missing], ignore_conflicts=True)
+            self.ids.update(Protein.objects.using(self.using).filter(name__in=missing).values_list("name", "id"))
+        return self.ids
+
+
+def resolve_ingest_method(using: str = None, method: str = "auto"):
+    """return the method used to write variants into the database, auto picks copy for postgresql and bulk otherwise"""
+    vendor = connections[using or router.db_for_write(Variant)].vendor
+    if method == "auto":
+        return "copy" if vendor == "postgresql" else "bulk"
+    if method == "copy" and vendor != "postgresql":
+        raise ValueError(f"COPY ingestion is only available for postgresql databases, not {vendor}")
+    return method
+
+
+class VariantBulkWriter:
+    """
+    class for writing tables of parsed alphamissense lines in ALPHAMISSENSE_BLOCK_SCHEMA into the variant table
+    postgresql databases are loaded with COPY FROM STDIN while other databases use a single executemany insert
+    the precomputed protein data is not touched, it is rebuilt for the written proteins afterward with materialize_protein_ids
+    """
+    copy_columns = ["protein_id", "position", "original", "mutated", "score", "pathogenicity"]
+
+    def __init__(self, using: str = None, method: str = "auto"):
+        self.using = using or router.db_for_write(Variant)
+        self.method = resolve_ingest_method(self.using, method)
+        self.proteins = ProteinNameCache(self.using)
+        # ids of the proteins of the last written table
+        self.protein_ids = []
+
+    def write(self, table: pa.Table, checkpoint: IngestCheckpoint = None):
+        """write a table of parsed lines in a single transaction, along with the checkpoint if given, and return the number of variants written"""
+        with transaction.atomic(using=self.using):
+            if len(table):
+                names = pc.unique(table["protein"]).to_pylist()
+                ids = self.proteins.resolve(names)
+                self.protein_ids = [ids[name] for name in names]
+                indices = pc.index_in(table["protein"], value_set=pa.array(names)).to_numpy(zero_copy_only=False)
+                table = table.set_column(0, "protein_id", pa.array(np.array(self.protein_ids, dtype=np.int64)[indices]))
+                if self.method == "copy":
+                    self.copy(table)
+                else:
+                    self.bulk_create(table)
+                bump_dataset_version(using=self.using)
+                bump_dataset_version(VARIANT_SCORES_DATASET, using=self.using)
+            else:
+                self.protein_ids = []
+            if checkpoint is not None:
+                checkpoint.save(using=self.using)
+        return len(table)
+
+    def bulk_create(self, table: pa.Table):
+        columns = ", ".join(self.copy_columns)
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {Variant._meta.db_table} ({columns}) VALUES ({', '.join(['%s'] * len(self.copy_columns))})",
+                zip(*(table[column].to_pylist() for column in self.copy_columns)),
+            )
+
+    def copy(self, table: pa.Table):
+        buffer = io.BytesIO()
+        pa_csv.write_csv(table.select(self.copy_columns), buffer, pa_csv.WriteOptions(include_header=False, delimiter="\t", quoting_style="none"))
+        buffer.seek(0)
+        with connections[self.using].cursor() as cursor:
+            cursor.copy_expert(f"COPY {Variant._meta.db_table} ({', '.join(self.copy_columns)}) FROM STDIN", buffer)
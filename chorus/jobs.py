@@ -0,0 +1,132 @@
+import hashlib
+import io
+import json
+import os
+from functools import lru_cache
+
+import django_rq
+import fakeredis
+from django.conf import settings
+from django.core.management import call_command
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from chorus.models import Protein
+from chorus.protein_figures import figure_cache_key, get_protein_figure, normalize_figure_options
+from chorus.uniprot import get_uniprot_record
+from chorus.versioning import get_dataset_version
+
+JOB_QUEUE = "default"
+# kinds of background jobs that can be submitted through the job api
+JOB_KINDS = ("uniprot", "figure", "ingest_alphamissense")
+# a job submitted again while it has one of these statuses is returned as is instead of being enqueued again
+REUSABLE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED, JobStatus.FINISHED)
+
+
+@lru_cache(maxsize=1)
+def _fake_redis_connection():
+    return fakeredis.FakeStrictRedis()
+
+
+def get_job_queue():
+    """return the rq queue of the background jobs, synchronous and backed by fakeredis when RQ_FAKE_REDIS is set"""
+    if settings.RQ_FAKE_REDIS:
+        return django_rq.get_queue(JOB_QUEUE, connection=_fake_redis_connection())
+    return django_rq.get_queue(JOB_QUEUE)
+
+
+def job_id(kind: str, *inputs):
+    """deterministic id of a job from its kind and the inputs its result depends on so identical submissions share a job"""
+    return f"{kind}-{hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:40]}"
+
+
+def fetch_job(id: str):
+    """return the job with that id or None when it does not exist or its result has expired"""
+    try:
+        return Job.fetch(id, connection=get_job_queue().connection)
+    except NoSuchJobError:
+        return None
+
+
+def discard_job(id: str):
+    job = fetch_job(id)
+    if job is not None:
+        job.delete()
+
+
+def enqueue_job(id: str, kind: str, func, kwargs: dict, meta: dict = None):
+    """
+    enqueue func(**kwargs) as a job with that id, a job with the same id that is still pending or has finished with a result not yet expired is returned instead
+    jobs that failed or were stopped are discarded and enqueued again
+    """
+    job = fetch_job(id)
+    if job is not None:
+        if job.get_status() in REUSABLE_JOB_STATUSES:
+            return job
+        job.delete()
+    return get_job_queue().enqueue(
+        func, kwargs=kwargs, job_id=id, meta={"kind": kind, **(meta or {})},
+        result_ttl=settings.JOB_RESULT_TTL, failure_ttl=settings.JOB_RESULT_TTL,
+    )
+
+
+def job_error(job: Job):
+    """return the last line of the traceback of a failed job"""
+    result = job.latest_result()
+    exc_string = getattr(result, "exc_string", None) or job.exc_info
+    if not exc_string:
+        return None
+    return exc_string.strip().splitlines()[-1]
+
+
+def job_state(job: Job):
+    """return the kind, status and timestamps of a job, with the error of a failed job"""
+    status = job.get_status()
+    return {
+        "id": job.id,
+        "kind": job.meta.get("kind"),
+        "status": status.value if isinstance(status, JobStatus) else status,
+        "enqueued_at": job.enqueued_at,
+        "started_at": job.started_at,
+        "ended_at": job.ended_at,
+        "error": job_error(job) if status == JobStatus.FAILED else None,
+    }
+
+
+def uniprot_job(accession: str):
+    return get_uniprot_record(accession)
+
+
+def figure_job(protein_id: int, options: dict):
+    return get_protein_figure(Protein.objects.get(id=protein_id), options)[0]
+
+
+def ingest_alphamissense_job(file_path: str, method: str = "auto", materialize: bool = True):
+    """load an alphamissense tabulated file with the load_alphamissense command and return the lines it wrote"""
+    out = io.StringIO()
+    call_command("load_alphamissense", file_path, method=method, no_materialize=not materialize, stdout=out)
+    return {"file_path": file_path, "log": out.getvalue().splitlines()}
+
+
+def uniprot_job_id(accession: str):
+    return job_id("uniprot", accession, settings.UNIPROT_BACKEND)
+
+
+def submit_uniprot_job(accession: str):
+    return enqueue_job(uniprot_job_id(accession), "uniprot", uniprot_job, {"accession": accession})
+
+
+def submit_figure_job(protein, options: dict):
+    """submit the rendering of a protein figure, the job is shared by every submission with the same protein, options and dataset version"""
+    options = normalize_figure_options(options)
+    key = figure_cache_key(protein, options, get_dataset_version())
+    content_type = "text/html" if options["output"] == "html" else "application/json"
+    return enqueue_job(job_id("figure", key), "figure", figure_job, {"protein_id": protein.id, "options": options}, {"content_type": content_type})
+
+
+def submit_ingest_alphamissense_job(file_path: str, method: str = "auto", materialize: bool = True):
+    """submit the loading of an alphamissense file, the same file is only loaded again once it changed on disk"""
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    id = job_id("ingest_alphamissense", file_path, stat.st_size, stat.st_mtime_ns, method, materialize)
+    return enqueue_job(id, "ingest_alphamissense", ingest_alphamissense_job, {"file_path": file_path, "method": method, "materialize": materialize})
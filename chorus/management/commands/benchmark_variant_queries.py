@@ -0,0 +1,86 @@
+import itertools
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from chorus.models import Variant
+from chorus.viewsets import VariantViewSets
+
+
+class Command(BaseCommand):
+    """
+    A command to time the variant queries produced by every combination of VariantViewSets filters and show which index the database picks for each of them
+    """
+    help = 'Time the variant queries produced by every combination of VariantViewSets filters and show their query plans, optionally against the same table without its indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times each query is run, the best time is reported')
+        parser.add_argument('--limit', type=int, default=20, help='Page size used for the timed queries')
+        parser.add_argument('--without-indexes', action='store_true', help='Also time every query after dropping the variant indexes inside a transaction that is rolled back afterward, on postgresql the DROP INDEX holds an ACCESS EXCLUSIVE lock on the variant table until the benchmark ends so it is refused unless DEBUG is on')
+        parser.add_argument('--full-plan', action='store_true', help='Print the complete query plan instead of a one line summary')
+
+    def handle(self, *args, **options):
+        using = router.db_for_read(Variant)
+        if options['without_indexes'] and connections[using].vendor == "postgresql" and not settings.DEBUG:
+            raise CommandError("--without-indexes locks the variant table against every read and write for the whole benchmark on postgresql, run it against a development database with DEBUG on")
+        sample = Variant.objects.using(using).select_related("protein").first()
+        if sample is None:
+            raise CommandError("The variant table is empty, load alphamissense data before running the benchmark")
+        values = {
+            "protein": sample.protein.name,
+            "position": sample.position,
+            "original": sample.original,
+            "mutated": sample.mutated,
+            "pathogenicity": sample.pathogenicity,
+            "score": (0.9, 1.0),
+        }
+        combinations = [c for r in range(1, len(values) + 1) for c in itertools.combinations(values, r)]
+
+        results = {c: self.measure(self.build_queryset(using, values, c), options) for c in combinations}
+        if options['without_indexes']:
+            with transaction.atomic(using=using):
+                with connections[using].cursor() as cursor:
+                    for index in Variant._meta.indexes:
+                        cursor.execute(f"DROP INDEX {connections[using].ops.quote_name(index.name)}")
+                for c in combinations:
+                    results[c] += self.measure(self.build_queryset(using, values, c), options)
+                transaction.set_rollback(True, using=using)
+
+        for c in combinations:
+            result = results[c]
+            line = f"{'+'.join(c):<55} {result[0]:>9.2f} ms"
+            if options['without_indexes']:
+                line += f" {result[2]:>9.2f} ms without indexes"
+            self.stdout.write(line)
+            self.stdout.write(f"    {result[1]}")
+            if options['without_indexes']:
+                self.stdout.write(f"    without indexes: {result[3]}")
+
+    def build_queryset(self, using, values, combination):
+        """build the queryset that VariantViewSets would filter with the query parameters in combination"""
+        filters = {}
+        for key in combination:
+            if key == "score":
+                filters[VariantViewSets.filter_mappings["score_min"]] = values["score"][0]
+                filters[VariantViewSets.filter_mappings["score_max"]] = values["score"][1]
+            else:
+                filters[VariantViewSets.filter_mappings[key]] = values[key]
+        return Variant.objects.using(using).filter(**filters)
+
+    def measure(self, queryset, options):
+        """return the best time in milliseconds for counting the queryset and fetching its first page along with the query plan of the page"""
+        page = queryset[:options['limit']]
+        best = None
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            queryset.count()
+            list(page)
+            elapsed = (time.perf_counter() - start) * 1000
+            if best is None or elapsed < best:
+                best = elapsed
+        plan = page.explain()
+        if not options['full_plan']:
+            plan = " | ".join(line.strip() for line in plan.splitlines() if line.strip())
+        return best, plan
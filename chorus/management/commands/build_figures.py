@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chorus.figures import RENDER_MODES
+from chorus.pipeline import load_config, run_pipeline
+
+
+class Command(BaseCommand):
+    """
+    A command to build the alphamissense score figures of the proteins listed in a json pipeline configuration
+    """
+    help = 'Build the html alphamissense score figures of the proteins of a json configuration with chorus.pipeline, reusing the cached stages whose inputs did not change'
+
+    def add_arguments(self, parser):
+        parser.add_argument('config_path', type=str, help='Path to the json configuration holding the alphamissense source, the output and cache directories and the list of proteins')
+        parser.add_argument('--workers', type=int, default=None, help='Number of worker processes, defaults to the number of cpus')
+        parser.add_argument('--no-cache', action='store_true', help='Compute every stage again without reading or writing the stage cache')
+        parser.add_argument('--render-mode', type=str, choices=RENDER_MODES, default=None, help='Render mode of the figures overriding the one of the configuration, auto switches to webgl above a point threshold and overview draws score bands instead of the variants only in alphamissense')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        config = load_config(options['config_path'])
+        if options['render_mode']:
+            config['render_mode'] = options['render_mode']
+        try:
+            figures = run_pipeline(config, options['workers'], not options['no_cache'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for accession, path in figures.items():
+            self.stdout.write(f"{accession}: {path}")
+        missing = [protein["accession"] for protein in config["proteins"] if protein["accession"] not in figures]
+        if missing:
+            self.stdout.write(self.style.WARNING(f"No uniprot entry found for {', '.join(missing)}"))
+        self.stdout.write(self.style.SUCCESS(f'Successfully built {len(figures)} figures in {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chorus.parquet import DEFAULT_PREFIX_LENGTH, convert_alphamissense, convert_annotation_workbook
+
+
+class Command(BaseCommand):
+    """
+    A command to convert the alphamissense tabulated file and the excel annotation workbooks used by the analysis scripts into a parquet dataset read with chorus.parquet
+    """
+    help = 'Convert an alphamissense tabulated file into a parquet dataset partitioned by accession prefix and excel annotation workbooks such as the gnomAD and MDSGene sheets into one parquet file per sheet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset_path', type=str, help='Directory of the parquet dataset, alphamissense rows are written to its alphamissense subdirectory and annotation sheets to its annotations subdirectory')
+        parser.add_argument('--alphamissense', type=str, help='Path to the alphamissense tabulated txt file, it can be gzip compressed')
+        parser.add_argument('--prefix-length', type=int, default=DEFAULT_PREFIX_LENGTH, help='Number of leading accession characters used to partition the alphamissense rows')
+        parser.add_argument('--annotations', type=str, nargs='*', default=[], help='Paths to excel workbooks whose sheets are converted')
+        parser.add_argument('--sheet', type=str, nargs='*', help='Names of the sheets to convert, all sheets are converted by default')
+
+    def handle(self, *args, **options):
+        if not options['alphamissense'] and not options['annotations']:
+            raise CommandError("Nothing to convert, pass --alphamissense or --annotations")
+        if options['alphamissense']:
+            start = time.perf_counter()
+            convert_alphamissense(options['alphamissense'], options['dataset_path'], options['prefix_length'])
+            self.stdout.write(f"Converted {options['alphamissense']} in {time.perf_counter() - start:.1f}s")
+        for file_path in options['annotations']:
+            names = convert_annotation_workbook(file_path, options['dataset_path'], options['sheet'])
+            for sheet_name, name in names.items():
+                self.stdout.write(f"Converted sheet {sheet_name} of {file_path} as {name}")
+        self.stdout.write(self.style.SUCCESS('Successfully converted the data to parquet'))
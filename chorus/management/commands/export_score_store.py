@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router
+
+from chorus.models import ProteinVariantMatrix
+from chorus.score_store import write_score_store
+
+
+class Command(BaseCommand):
+    """
+    A command to export the precomputed per protein data into the memory mapped score store read by the variant lookup action
+    """
+    help = 'Export the precomputed per protein data into the memory mapped score store read by the variant lookup action, the store has to be exported again after every ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('store_path', type=str, nargs='?', default=None, help='Directory of the score store, defaults to the SCORE_STORE_PATH setting')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of proteins read from the database at once')
+
+    def handle(self, *args, **options):
+        store_path = options['store_path'] or settings.SCORE_STORE_PATH
+        if not store_path:
+            raise CommandError("No store path given and the SCORE_STORE_PATH setting is not set")
+        start = time.perf_counter()
+        try:
+            proteins = write_score_store(
+                store_path, router.db_for_read(ProteinVariantMatrix), options['batch_size'],
+                progress=lambda n: self.stdout.write(f"Exported {n} proteins"),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Successfully exported {proteins} proteins to {store_path} in {time.perf_counter() - start:.1f}s'))
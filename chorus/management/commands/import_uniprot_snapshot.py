@@ -0,0 +1,41 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from chorus.domains import build_uniprot_domains
+from chorus.models import Protein, UniprotEntry
+from chorus.uniprot import UNIPROT_TSV_COLUMNS, invalidate_uniprot_records
+from chorus.versioning import bump_dataset_version
+
+
+class Command(BaseCommand):
+    """
+    A command to import a uniprot tabulated download into the local uniprot snapshot used when UNIPROT_BACKEND is local and rebuild the uniprot domains of the matching proteins
+    """
+    help = 'Import a uniprot tabulated download with the Entry, Entry Name, Domain [FT], Sequence and Gene Names columns into the local uniprot snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='Path to the uniprot tabulated file, it can be gzip compressed')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Number of entries imported per transaction')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(UniprotEntry)
+        total = 0
+        reader = pd.read_csv(options['file_path'], sep="\t", chunksize=options['chunk_size'], dtype=str)
+        for chunk in reader:
+            missing = [c for c in UNIPROT_TSV_COLUMNS if c not in chunk.columns]
+            if missing:
+                raise CommandError(f"The uniprot file is missing the columns {', '.join(missing)}")
+            chunk = chunk[list(UNIPROT_TSV_COLUMNS)].rename(columns=UNIPROT_TSV_COLUMNS)
+            chunk = chunk.astype(object).where(pd.notnull(chunk), None)
+            entries = [UniprotEntry(**row) for row in chunk.to_dict(orient="records")]
+            accessions = [entry.accession for entry in entries]
+            with transaction.atomic(using=using):
+                UniprotEntry.objects.using(using).filter(accession__in=accessions).delete()
+                UniprotEntry.objects.using(using).bulk_create(entries)
+                build_uniprot_domains(Protein.objects.using(using).filter(name__in=accessions).values_list("id", flat=True), using)
+                bump_dataset_version(using=using)
+            invalidate_uniprot_records(accessions)
+            total += len(entries)
+            self.stdout.write(f"Imported {total} uniprot entries")
+        self.stdout.write(self.style.SUCCESS('Successfully imported the uniprot snapshot'))
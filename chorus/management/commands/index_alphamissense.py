@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chorus.alphamissense import AlphaMissenseIndex, default_index_path
+
+
+class Command(BaseCommand):
+    """
+    A command to build the byte offset index of an alphamissense tabulated file so the variants of a few proteins can be read without scanning the whole file
+    """
+    help = 'Build the byte offset index of the protein blocks of an alphamissense tabulated file, plain or compressed with bgzip, used by chorus.alphamissense.AlphaMissenseIndex'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='Path to the alphamissense tabulated txt file to be indexed')
+        parser.add_argument('--index-path', type=str, default=None, help='Path of the index file ending with .npz, defaults to the file path followed by .idx.npz')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            index = AlphaMissenseIndex.build(options['file_path'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        index_path = options['index_path'] or default_index_path(options['file_path'])
+        index.save(index_path)
+        self.stdout.write(f"Indexed {len(index.positions)} proteins in {len(index.accessions)} blocks in {time.perf_counter() - start:.1f}s")
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote the alphamissense index to {index_path}'))
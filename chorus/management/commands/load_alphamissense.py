@@ -1,9 +1,18 @@
-import re
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import django
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connections, router
+
+from chorus.ingestion import alphamissense_protein_names, create_ingest_checkpoints, delete_protein_variants, load_alphamissense_shard, materialize_protein_batches, resolve_ingest_method
+from chorus.models import IngestCheckpoint, Protein, ProteinVariantMatrix, Variant
+
+
+def init_worker():
+    django.setup()
 
-from chorus.models import Protein, Variant
 
 class Command(BaseCommand):
     """
@@ -13,43 +22,74 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('file_path', type=str, help='Path to the alphamissense tabulated txt file to be processed')
+        parser.add_argument('--batch-size', type=int, default=1000000, help='Number of lines parsed and written per transaction')
+        parser.add_argument('--method', type=str, choices=["auto", "bulk", "copy"], default="auto", help='Ingestion method, auto uses COPY FROM STDIN on postgresql and bulk_create otherwise')
+        parser.add_argument('--workers', type=int, default=1, help='Number of processes used to load the file, the file is split into one shard per worker along protein boundaries')
+        parser.add_argument('--no-materialize', action='store_true', help='Skip building the precomputed per protein data once the variants are loaded, it can be built later with the materialize_protein_data command')
+        parser.add_argument('--restart', action='store_true', help='Delete the variants already loaded for the proteins of this file and the checkpoints of a previous run, then load it from the start')
 
     def handle(self, *args, **options):
-        file_path = options['file_path']
-        pattern = re.compile(r"([A-Z]+)(\d+)([A-Z]+)")
-        with open(file_path, 'r') as f:
-            temp_data = []
-            current_protein = None
-            for _ in range(4):
-                next(f)
-            for line in f:
-                line = line.strip().split('\t')
-                protein_name = line[0]
-                search_result = pattern.search(line[1])
-                if search_result:
-                    score = line[2]
-                    position = int(search_result.group(2))
-                    original = search_result.group(1)
-                    mutated = search_result.group(3)
-                    pathogenicity = line[3]
-                    if current_protein is None:
-                        protein = Protein.objects.get_or_create(name=protein_name, description="")
-                        if type(protein) == tuple:
-                            current_protein = protein[0]
-                        else:
-                            current_protein = protein
-                    if current_protein.name != protein_name:
-                        with transaction.atomic():
-                            for data in temp_data:
-                                Variant.objects.create(protein=current_protein, position=data[1], original=data[2], mutated=data[3], score=data[4], pathogenicity=data[5])
-                            temp_data = []
-                            protein = Protein.objects.get_or_create(name=protein_name, description="")
-                            if type(protein) == tuple:
-                                current_protein = protein[0]
-                            else:
-                                current_protein = protein
-                    temp_data.append((protein_name, position, original, mutated, score, pathogenicity))
-            with transaction.atomic():
-                for data in temp_data:
-                    Variant.objects.create(protein=current_protein, position=data[1], original=data[2], mutated=data[3], score=data[4], pathogenicity=data[5])
-        self.stdout.write(self.style.SUCCESS('Successfully parsed and stored alphamissense data in database'))
\ No newline at end of file
+        file_path = os.path.abspath(options['file_path'])
+        workers = options['workers']
+        using = router.db_for_write(Variant)
+        try:
+            method = resolve_ingest_method(using, options['method'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if workers > 1 and connections[using].vendor != "postgresql":
+            raise CommandError(f"Parallel ingestion requires a postgresql variant database, {connections[using].vendor} only allows one writer at a time")
+
+        checkpoints = IngestCheckpoint.objects.using(router.db_for_write(IngestCheckpoint)).filter(source=file_path)
+        if options['restart']:
+            # the variants already loaded from this file would otherwise be inserted a second time
+            deleted = delete_protein_variants(alphamissense_protein_names(file_path), using)
+            self.stdout.write(f"Deleted {deleted} previously loaded variants of the proteins in {file_path}")
+            checkpoints.delete()
+        elif checkpoints.exclude(file_size=os.path.getsize(file_path)).exists():
+            raise CommandError(f"{file_path} changed size since it was partially loaded, use --restart to delete the variants of its proteins and load it again")
+        if not checkpoints.exists():
+            create_ingest_checkpoints(file_path, workers)
+        else:
+            self.stdout.write(f"Resuming {file_path} from {checkpoints.count()} existing shard checkpoints")
+        pending = [c.id for c in checkpoints.filter(completed=False)]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('All shards of this file have already been loaded, use --restart to load it again'))
+            if not options['no_materialize']:
+                self.materialize(set(), using, workers)
+            return
+
+        start = time.perf_counter()
+
+        def report(total):
+            self.stdout.write(f"Loaded {total} variants ({total / (time.perf_counter() - start):.0f} rows/s)")
+
+        total = 0
+        protein_ids = set()
+        if workers == 1:
+            for checkpoint_id in pending:
+                loaded, shard_protein_ids = load_alphamissense_shard(checkpoint_id, options['batch_size'], method, progress=lambda n, loaded=total: report(loaded + n))
+                total += loaded
+                protein_ids |= shard_protein_ids
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                futures = [executor.submit(load_alphamissense_shard, checkpoint_id, options['batch_size'], method) for checkpoint_id in pending]
+                for future in as_completed(futures):
+                    loaded, shard_protein_ids = future.result()
+                    total += loaded
+                    protein_ids |= shard_protein_ids
+                    report(total)
+
+        if not options['no_materialize']:
+            self.materialize(protein_ids, using, workers)
+        self.stdout.write(self.style.SUCCESS('Successfully parsed and stored alphamissense data in database'))
+
+    def materialize(self, protein_ids: set, using: str, workers: int):
+        """build the precomputed data of the loaded proteins in a pass of its own after all of their variants are written"""
+        # proteins written by an earlier interrupted run have no precomputed data yet either
+        protein_ids = protein_ids | set(Protein.objects.using(using).exclude(id__in=ProteinVariantMatrix.objects.using(using).values("protein_id")).values_list("id", flat=True))
+        start = time.perf_counter()
+        materialize_protein_batches(
+            protein_ids, workers=workers,
+            progress=lambda n: self.stdout.write(f"Materialized {n} of {len(protein_ids)} proteins ({n / (time.perf_counter() - start):.0f} proteins/s)"),
+        )
@@ -0,0 +1,30 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from chorus.domains import CURATED_DOMAIN_COLUMNS, load_curated_domains
+from chorus.models import ProteinDomain
+from chorus.versioning import bump_dataset_version
+
+
+class Command(BaseCommand):
+    """
+    A command to load curated protein domains that replace the uniprot domains of their proteins
+    """
+    help = 'Load a tabulated file of curated protein domains with the accession, domain, start and end columns, the curated domains of a protein replace all of its uniprot domains. chorus/fixtures/curated_domains.tsv holds the LRRK2 domain map'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', type=str, help='Path to the tabulated curated domain file')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(ProteinDomain)
+        df = pd.read_csv(options['file_path'], sep="\t", dtype={"accession": str, "domain": str})
+        missing = [c for c in CURATED_DOMAIN_COLUMNS if c not in df.columns]
+        if missing:
+            raise CommandError(f"The curated domain file is missing the columns {', '.join(missing)}")
+        with transaction.atomic(using=using):
+            skipped = load_curated_domains(df, using)
+            bump_dataset_version(using=using)
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped the domains of {', '.join(skipped)}, these proteins are not in the database"))
+        self.stdout.write(self.style.SUCCESS(f'Successfully loaded the curated domains of {df["accession"].nunique() - len(skipped)} proteins'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+
+from chorus.ingestion import materialize_protein_batches
+from chorus.models import Protein, Variant
+
+
+class Command(BaseCommand):
+    """
+    A command to rebuild the precomputed per protein data from the variants already stored in the database
+    """
+    help = 'Rebuild the precomputed per protein data from the variants already stored in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--protein', type=str, nargs='*', help='Names of the proteins to rebuild, all proteins are rebuilt by default')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of proteins rebuilt per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Number of processes rebuilding batches of proteins at the same time')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(Variant)
+        if options['workers'] > 1 and connections[using].vendor != "postgresql":
+            raise CommandError(f"Parallel materialization requires a postgresql variant database, {connections[using].vendor} only allows one writer at a time")
+        proteins = Protein.objects.using(using).order_by("id")
+        if options['protein']:
+            proteins = proteins.filter(name__in=options['protein'])
+        protein_ids = list(proteins.values_list("id", flat=True))
+        materialize_protein_batches(
+            protein_ids, options['batch_size'], options['workers'],
+            progress=lambda n: self.stdout.write(f"Materialized {n} of {len(protein_ids)} proteins"),
+        )
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt the precomputed protein data'))
@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+
+from chorus.models import Pathogenicity
+
+# column order of the position by substitution matrices
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+# pathogenicity code of the cells without a variant, the score of those cells is NaN
+MISSING_PATHOGENICITY = 255
+# reference residue of the positions without a variant
+MISSING_RESIDUE = "X"
+
+# lookup table from the ascii code of a residue to its column
+_residue_index = np.full(128, -1, dtype=np.int16)
+_residue_index[np.frombuffer(AMINO_ACIDS.encode("ascii"), dtype=np.uint8)] = np.arange(len(AMINO_ACIDS))
+
+
+def build_variant_matrix(positions, originals, mutated, scores, pathogenicity):
+    """
+    build the dense matrices of a protein from the columns of its variants
+    return the protein length, the reference sequence, a length x 20 float32 score matrix and a length x 20 uint8 pathogenicity matrix
+    variants with a mutated residue outside of AMINO_ACIDS are left out
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    length = int(positions.max()) if len(positions) else 0
+    columns = _residue_index[np.frombuffer("".join(mutated).encode("ascii"), dtype=np.uint8)]
+    keep = columns >= 0
+    rows = positions[keep] - 1
+    score_matrix = np.full((length, len(AMINO_ACIDS)), np.nan, dtype=np.float32)
+    score_matrix[rows, columns[keep]] = np.asarray(scores, dtype=np.float32)[keep]
+    pathogenicity_matrix = np.full((length, len(AMINO_ACIDS)), MISSING_PATHOGENICITY, dtype=np.uint8)
+    pathogenicity_matrix[rows, columns[keep]] = np.asarray(pathogenicity, dtype=np.uint8)[keep]
+    reference = np.full(length, ord(MISSING_RESIDUE), dtype=np.uint8)
+    reference[positions - 1] = np.frombuffer("".join(originals).encode("ascii"), dtype=np.uint8)
+    return length, reference.tobytes().decode("ascii"), score_matrix, pathogenicity_matrix
+
+
+def load_variant_matrix(matrix):
+    """return the score and pathogenicity arrays stored in a ProteinVariantMatrix"""
+    shape = (matrix.length, len(AMINO_ACIDS))
+    scores = np.frombuffer(bytes(matrix.scores), dtype=np.float32).reshape(shape)
+    pathogenicity = np.frombuffer(bytes(matrix.pathogenicity), dtype=np.uint8).reshape(shape)
+    return scores, pathogenicity
+
+
+def variant_matrix_to_npz(matrix):
+    """serialize a ProteinVariantMatrix into an uncompressed npz archive holding the scores, pathogenicity and reference arrays"""
+    scores, pathogenicity = load_variant_matrix(matrix)
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        scores=scores,
+        pathogenicity=pathogenicity,
+        reference=np.frombuffer(matrix.reference.encode("ascii"), dtype="S1"),
+    )
+    return buffer.getvalue()
+
+
+def variant_matrix_to_dict(matrix):
+    """json friendly representation of a ProteinVariantMatrix where the missing cells are None and scores are rounded back to the 4 decimals of alphamissense"""
+    scores, pathogenicity = load_variant_matrix(matrix)
+    score_list = np.where(np.isnan(scores), None, np.round(scores.astype(np.float64), 4)).tolist()
+    pathogenicity_list = np.where(pathogenicity == MISSING_PATHOGENICITY, None, pathogenicity).tolist()
+    return {
+        "alphabet": AMINO_ACIDS,
+        "pathogenicity_classes": dict(Pathogenicity.choices),
+        "length": matrix.length,
+        "reference": matrix.reference,
+        "scores": score_list,
+        "pathogenicity": pathogenicity_list,
+    }
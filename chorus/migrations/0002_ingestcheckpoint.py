@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=1000)),
+                ('file_size', models.BigIntegerField()),
+                ('shard', models.IntegerField()),
+                ('start_offset', models.BigIntegerField()),
+                ('end_offset', models.BigIntegerField()),
+                ('offset', models.BigIntegerField()),
+                ('protein', models.CharField(blank=True, max_length=100)),
+                ('completed', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['source', 'shard'],
+                'db_table': 'chorus_ingest_checkpoint',
+                'unique_together': {('source', 'shard')},
+            },
+        ),
+    ]
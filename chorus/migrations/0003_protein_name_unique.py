@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_proteins(apps, schema_editor):
+    """point the variants of proteins sharing the same name to the first of them and delete the others"""
+    Protein = apps.get_model('chorus', 'Protein')
+    Variant = apps.get_model('chorus', 'Variant')
+    db_alias = schema_editor.connection.alias
+    duplicates = Protein.objects.using(db_alias).values('name').annotate(total=models.Count('id'), first_id=models.Min('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        others = Protein.objects.using(db_alias).filter(name=duplicate['name']).exclude(id=duplicate['first_id'])
+        Variant.objects.using(db_alias).filter(protein__in=others).update(protein_id=duplicate['first_id'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0002_ingestcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_proteins, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='protein',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0003_protein_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['protein', 'position', 'original', 'mutated'], name='variant_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['protein', 'pathogenicity', 'score'], name='variant_protein_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['pathogenicity', 'score'], name='variant_class_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['score'], name='variant_score_idx'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='protein',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='chorus.protein'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+import chorus.models
+from django.db import migrations, models
+
+
+PATHOGENICITY_CODES = {
+    0: ['benign', 'likely_benign'],
+    1: ['ambiguous'],
+    2: ['pathogenic', 'likely_pathogenic'],
+}
+
+
+def encode_pathogenicity(apps, schema_editor):
+    """convert the free text pathogenicity classes into their small integer codes with one update per class"""
+    Variant = apps.get_model('chorus', 'Variant')
+    db_alias = schema_editor.connection.alias
+    for code, labels in PATHOGENICITY_CODES.items():
+        Variant.objects.using(db_alias).filter(pathogenicity__in=labels).update(pathogenicity_code=code)
+
+
+def decode_pathogenicity(apps, schema_editor):
+    Variant = apps.get_model('chorus', 'Variant')
+    db_alias = schema_editor.connection.alias
+    for code, labels in PATHOGENICITY_CODES.items():
+        Variant.objects.using(db_alias).filter(pathogenicity_code=code).update(pathogenicity=labels[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0004_variant_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='variant',
+            name='variant_protein_class_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='variant',
+            name='variant_class_score_idx',
+        ),
+        migrations.AddField(
+            model_name='variant',
+            name='pathogenicity_code',
+            field=models.SmallIntegerField(choices=[(0, 'benign'), (1, 'ambiguous'), (2, 'pathogenic')], null=True),
+        ),
+        migrations.RunPython(encode_pathogenicity, decode_pathogenicity),
+        migrations.RemoveField(
+            model_name='variant',
+            name='pathogenicity',
+        ),
+        migrations.RenameField(
+            model_name='variant',
+            old_name='pathogenicity_code',
+            new_name='pathogenicity',
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='pathogenicity',
+            field=models.SmallIntegerField(choices=[(0, 'benign'), (1, 'ambiguous'), (2, 'pathogenic')]),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='original',
+            field=models.CharField(max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='mutated',
+            field=models.CharField(max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='score',
+            field=chorus.models.Float32Field(),
+        ),
+        migrations.RemoveField(
+            model_name='variant',
+            name='created_at',
+        ),
+        migrations.RemoveField(
+            model_name='variant',
+            name='updated_at',
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['protein', 'pathogenicity', 'score'], name='variant_protein_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['pathogenicity', 'score'], name='variant_class_score_idx'),
+        ),
+    ]
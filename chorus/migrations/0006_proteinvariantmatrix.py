@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0005_compact_variant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProteinVariantMatrix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.IntegerField()),
+                ('reference', models.TextField()),
+                ('scores', models.BinaryField()),
+                ('pathogenicity', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('protein', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='variant_matrix', to='chorus.protein')),
+            ],
+            options={
+                'ordering': ['id'],
+                'db_table': 'chorus_protein_variant_matrix',
+            },
+        ),
+    ]
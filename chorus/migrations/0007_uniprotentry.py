@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0006_proteinvariantmatrix'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UniprotEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accession', models.CharField(max_length=20, unique=True)),
+                ('entry_name', models.CharField(max_length=50)),
+                ('domain', models.TextField(blank=True, null=True)),
+                ('sequence', models.TextField()),
+                ('gene_names', models.TextField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'db_table': 'chorus_uniprot_entry',
+            },
+        ),
+    ]
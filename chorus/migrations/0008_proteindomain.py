@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0007_uniprotentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProteinDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255)),
+                ('start', models.IntegerField()),
+                ('end', models.IntegerField()),
+                ('source', models.CharField(choices=[('uniprot', 'uniprot'), ('curated', 'curated')], default='curated', max_length=10)),
+                ('protein', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='domains', to='chorus.protein')),
+            ],
+            options={
+                'ordering': ['protein', 'start', 'id'],
+                'db_table': 'chorus_protein_domain',
+                'indexes': [
+                    models.Index(fields=['protein', 'start', 'end'], name='domain_interval_idx'),
+                    models.Index(fields=['domain', 'protein'], name='domain_name_idx'),
+                ],
+            },
+        ),
+    ]
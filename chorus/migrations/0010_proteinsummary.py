@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0009_datasetversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProteinSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('length', models.IntegerField()),
+                ('variant_count', models.IntegerField()),
+                ('min_score', models.FloatField()),
+                ('mean_score', models.FloatField()),
+                ('max_score', models.FloatField()),
+                ('benign_count', models.IntegerField()),
+                ('ambiguous_count', models.IntegerField()),
+                ('pathogenic_count', models.IntegerField()),
+                ('position_scores', models.BinaryField()),
+                ('position_counts', models.BinaryField()),
+                ('histogram', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('protein', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='chorus.protein')),
+            ],
+            options={
+                'ordering': ['id'],
+                'db_table': 'chorus_protein_summary',
+            },
+        ),
+    ]
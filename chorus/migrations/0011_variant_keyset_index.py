@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chorus', '0010_proteinsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['protein', 'position', 'id'], name='variant_keyset_idx'),
+        ),
+    ]
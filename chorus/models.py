@@ -5,7 +5,7 @@ from django.db import models
 
 class Protein(models.Model):
     """class for storing protein name to be used later as key for variant data class"""
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -19,16 +19,39 @@ class Protein(models.Model):
         db_table = "chorus_protein"
 
 
+class Pathogenicity(models.IntegerChoices):
+    """alphamissense pathogenicity classes stored as small integers, the labels are the class names returned by the api"""
+    BENIGN = 0, "benign"
+    AMBIGUOUS = 1, "ambiguous"
+    PATHOGENIC = 2, "pathogenic"
+
+
+# class names accepted from alphamissense files and api filters, newer alphamissense releases prefix the classes with likely_
+PATHOGENICITY_CODES = {
+    "benign": Pathogenicity.BENIGN,
+    "likely_benign": Pathogenicity.BENIGN,
+    "ambiguous": Pathogenicity.AMBIGUOUS,
+    "pathogenic": Pathogenicity.PATHOGENIC,
+    "likely_pathogenic": Pathogenicity.PATHOGENIC,
+}
+
+
+class Float32Field(models.FloatField):
+    """float field stored as a 4 byte real on postgresql instead of double precision, sqlite always stores 8 byte reals"""
+    def db_type(self, connection):
+        if connection.vendor == "postgresql":
+            return "real"
+        return super().db_type(connection)
+
+
 class Variant(models.Model):
     """class for storing variant data that use protein as key and has 3 other columns storing position, original residue and mutated residue"""
-    protein = models.ForeignKey(Protein, on_delete=models.CASCADE)
+    protein = models.ForeignKey(Protein, on_delete=models.CASCADE, db_index=False)
     position = models.IntegerField()
-    original = models.CharField(max_length=100)
-    mutated = models.CharField(max_length=100)
-    score = models.FloatField()
-    pathogenicity = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    original = models.CharField(max_length=1)
+    mutated = models.CharField(max_length=1)
+    score = Float32Field()
+    pathogenicity = models.SmallIntegerField(choices=Pathogenicity.choices)
 
 
     def __str__(self):
@@ -38,6 +61,168 @@ class Variant(models.Model):
         ordering = ["id"]
         app_label = "variant_data"
         db_table = "chorus_variant"
+        # the lookup index leads with protein so it also replaces the foreign key index
+        indexes = [
+            models.Index(fields=["protein", "position", "original", "mutated"], name="variant_lookup_idx"),
+            models.Index(fields=["protein", "pathogenicity", "score"], name="variant_protein_class_idx"),
+            models.Index(fields=["pathogenicity", "score"], name="variant_class_score_idx"),
+            models.Index(fields=["score"], name="variant_score_idx"),
+            # keyset pagination order of VariantViewSets
+            models.Index(fields=["protein", "position", "id"], name="variant_keyset_idx"),
+        ]
+
+
+class ProteinVariantMatrix(models.Model):
+    """
+    class for storing the dense position by substitution matrices of a protein computed at ingestion
+    scores holds float32 values and pathogenicity holds uint8 class codes, both as row major arrays of length rows and one column per residue of chorus.matrix.AMINO_ACIDS
+    """
+    protein = models.OneToOneField(Protein, on_delete=models.CASCADE, related_name="variant_matrix")
+    length = models.IntegerField()
+    reference = models.TextField()
+    scores = models.BinaryField()
+    pathogenicity = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.protein_id} {self.length}x20"
+
+    class Meta:
+        ordering = ["id"]
+        app_label = "protein_data"
+        db_table = "chorus_protein_variant_matrix"
+
+
+class ProteinSummary(models.Model):
+    """
+    class for storing the aggregate statistics of the variants of a protein computed at ingestion so clients do not need every variant to summarize a protein
+    position_scores holds the float32 minimum, mean and maximum score and position_counts the uint16 number of variants of every pathogenicity class, both as row major arrays of length rows
+    the counts have one column per Pathogenicity code and histogram holds the int32 number of variants in each of the chorus.statistics.SUMMARY_HISTOGRAM_BINS equal score bins between 0 and 1
+    """
+    protein = models.OneToOneField(Protein, on_delete=models.CASCADE, related_name="summary")
+    length = models.IntegerField()
+    variant_count = models.IntegerField()
+    min_score = models.FloatField()
+    mean_score = models.FloatField()
+    max_score = models.FloatField()
+    benign_count = models.IntegerField()
+    ambiguous_count = models.IntegerField()
+    pathogenic_count = models.IntegerField()
+    position_scores = models.BinaryField()
+    position_counts = models.BinaryField()
+    histogram = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.protein_id} {self.variant_count} variants"
+
+    class Meta:
+        ordering = ["id"]
+        app_label = "protein_data"
+        db_table = "chorus_protein_summary"
+
+
+class UniprotEntry(models.Model):
+    """
+    class for storing an entry of a locally imported uniprot snapshot so uniprot data can be served without reaching the uniprot rest api
+    columns are kept as the raw text of the uniprot tabulated download
+    """
+    accession = models.CharField(max_length=20, unique=True)
+    entry_name = models.CharField(max_length=50)
+    domain = models.TextField(null=True, blank=True)
+    sequence = models.TextField()
+    gene_names = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.accession
+
+    class Meta:
+        ordering = ["id"]
+        app_label = "protein_data"
+        db_table = "chorus_uniprot_entry"
+
+
+class DomainSource(models.TextChoices):
+    """origin of a protein domain, curated domains of a protein replace all of its uniprot domains"""
+    UNIPROT = "uniprot", "uniprot"
+    CURATED = "curated", "curated"
+
+
+class ProteinDomainQuerySet(models.QuerySet):
+    def effective(self):
+        """keep the curated domains and the uniprot domains of the proteins that have no curated domain"""
+        curated = ProteinDomain.objects.filter(protein_id=models.OuterRef("protein_id"), source=DomainSource.CURATED)
+        return self.filter(models.Q(source=DomainSource.CURATED) | ~models.Exists(curated))
+
+
+class ProteinDomain(models.Model):
+    """
+    class for storing the functional domain intervals of a protein, start and end are the inclusive 1 based positions of the domain
+    uniprot domains are derived from the uniprot snapshot at ingestion along with the Other intervals between them while curated domains are loaded from a curated file or the api
+    """
+    protein = models.ForeignKey(Protein, on_delete=models.CASCADE, related_name="domains", db_index=False)
+    domain = models.CharField(max_length=255)
+    start = models.IntegerField()
+    end = models.IntegerField()
+    source = models.CharField(max_length=10, choices=DomainSource.choices, default=DomainSource.CURATED)
+
+    objects = ProteinDomainQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.protein_id} {self.domain} {self.start}..{self.end}"
+
+    class Meta:
+        ordering = ["protein", "start", "id"]
+        app_label = "protein_data"
+        db_table = "chorus_protein_domain"
+        # the interval index leads with protein so it also replaces the foreign key index
+        indexes = [
+            models.Index(fields=["protein", "start", "end"], name="domain_interval_idx"),
+            models.Index(fields=["domain", "protein"], name="domain_name_idx"),
+        ]
+
+
+class DatasetVersion(models.Model):
+    """
+    class for storing a counter that is increased every time the data of a dataset changes, derived results such as rendered figures are cached under the current version
+    """
+    name = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} {self.version}"
+
+    class Meta:
+        ordering = ["id"]
+        app_label = "protein_data"
+        db_table = "chorus_dataset_version"
+
+
+class IngestCheckpoint(models.Model):
+    """
+    class for storing the progress of one shard of an alphamissense file, offset is the byte position right after the last committed line and protein the protein of that line so an interrupted ingestion can resume from there
+    """
+    source = models.CharField(max_length=1000)
+    file_size = models.BigIntegerField()
+    shard = models.IntegerField()
+    start_offset = models.BigIntegerField()
+    end_offset = models.BigIntegerField()
+    offset = models.BigIntegerField()
+    protein = models.CharField(max_length=100, blank=True)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} shard {self.shard}"
+
+    class Meta:
+        ordering = ["source", "shard"]
+        unique_together = [["source", "shard"]]
+        app_label = "protein_data"
+        db_table = "chorus_ingest_checkpoint"
 
 class ChorusSession(models.Model):
     """
@@ -0,0 +1,157 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """return the number of rows the postgresql planner expects the queryset to return, other databases fall back to an exact count"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class ChorusPagination(LimitOffsetPagination):
+    """
+    limit offset pagination that can also page with a keyset cursor and skip or estimate the total count
+
+    ?pagination=cursor, or any cursor parameter, switches to keyset pagination over the keyset_ordering of the view so deep pages cost the same as the first one
+    ?count=exact|estimate|none chooses how the total count is computed, it defaults to exact for limit offset pages and none for cursor pages
+    """
+    cursor_query_param = "cursor"
+    pagination_query_param = "pagination"
+    count_query_param = "count"
+    default_keyset_ordering = ("id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.use_cursor = self.cursor_query_param in request.query_params or request.query_params.get(self.pagination_query_param) == "cursor"
+        self.count_mode = request.query_params.get(self.count_query_param, "none" if self.use_cursor else "exact")
+        if self.count_mode not in ("exact", "estimate", "none"):
+            raise ValidationError({self.count_query_param: "Expected one of exact, estimate or none"})
+        if not self.use_cursor and self.count_mode == "exact":
+            return super().paginate_queryset(queryset, request, view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        if self.count_mode == "exact":
+            self.count = self.get_count(queryset)
+        elif self.count_mode == "estimate":
+            self.count = estimate_count(queryset)
+        else:
+            self.count = None
+
+        if self.use_cursor:
+            self.keyset_ordering = getattr(view, "keyset_ordering", self.default_keyset_ordering)
+            key = self.decode_cursor(request)
+            if key is not None:
+                queryset = self.keyset_filter(queryset, key)
+            results = list(queryset.order_by(*self.keyset_ordering)[:self.limit + 1])
+        else:
+            self.offset = self.get_offset(request)
+            results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        results = results[:self.limit]
+        if self.use_cursor and self.has_next:
+            self.next_key = [self.get_key_value(results[-1], field) for field in self.keyset_ordering]
+        return results
+
+    def keyset_filter(self, queryset, key):
+        """
+        filter the queryset down to the rows that come after key in the keyset ordering
+        the ordering is compared as a single row value so the database walks one index in order, an index on the keyset ordering fields is expected
+        """
+        if len(self.keyset_ordering) == 1:
+            return queryset.filter(**{f"{self.keyset_ordering[0]}__gt": key[0]})
+        quote_name = connections[queryset.db].ops.quote_name
+        table = quote_name(queryset.model._meta.db_table)
+        columns = ", ".join(f"{table}.{quote_name(queryset.model._meta.get_field(field).column)}" for field in self.keyset_ordering)
+        placeholders = ", ".join(["%s"] * len(key))
+        return queryset.extra(where=[f"({columns}) > ({placeholders})"], params=list(key))
+
+    def get_key_value(self, row, field):
+        if isinstance(row, dict):
+            return row[field]
+        return getattr(row, field)
+
+    def encode_cursor(self, key):
+        return base64.urlsafe_b64encode(",".join(str(value) for value in key).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            key = [int(value) for value in base64.urlsafe_b64decode(cursor.encode()).decode().split(",")]
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor"})
+        if len(key) != len(self.keyset_ordering):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor"})
+        return key
+
+    def get_next_link(self):
+        if not self.use_cursor and self.count_mode == "exact":
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.use_cursor:
+            return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_key))
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.use_cursor:
+            return None
+        return super().get_previous_link()
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("count", self.count),
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"]["nullable"] = True
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset cursor returned in the next link of a cursor paginated response",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.pagination_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to cursor to page with a keyset cursor instead of limit and offset",
+                "schema": {"type": "string", "enum": ["offset", "cursor"]},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "How the total count is computed, exact by default for limit offset pages and none for cursor pages",
+                "schema": {"type": "string", "enum": ["exact", "estimate", "none"]},
+            },
+        ]
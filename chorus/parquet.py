@@ -0,0 +1,143 @@
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from chorus.utils import VARIANT_REGEX
+
+# subdirectories of a chorus parquet dataset
+ALPHAMISSENSE_DATASET = "alphamissense"
+ANNOTATION_DATASET = "annotations"
+# number of leading characters of the accession used as the hive partition of the alphamissense rows
+DEFAULT_PREFIX_LENGTH = 2
+ALPHAMISSENSE_SCHEMA = pa.schema([
+    ("UniprotID", pa.string()),
+    ("Variant", pa.string()),
+    ("Score", pa.float32()),
+    ("Pathogenicity", pa.dictionary(pa.int32(), pa.string())),
+    ("Position", pa.int32()),
+    ("Original", pa.string()),
+    ("Mutated", pa.string()),
+    ("prefix", pa.string()),
+])
+# schema metadata key recording the prefix length a dataset was partitioned with
+PREFIX_LENGTH_METADATA = b"chorus.prefix_length"
+
+
+def _count_comment_lines(file_path: str):
+    """return the number of comment lines at the start of a possibly compressed tabulated file"""
+    with pa.input_stream(file_path, compression="detect") as f:
+        head = f.read(1 << 16)
+    count = 0
+    for line in head.splitlines():
+        if not line.startswith(b"#"):
+            break
+        count += 1
+    return count
+
+
+def iter_alphamissense_record_batches(file_path: str, prefix_length: int = DEFAULT_PREFIX_LENGTH, block_size: int = 64 << 20):
+    """stream an alphamissense tabulated file, plain or gzip compressed, as record batches of ALPHAMISSENSE_SCHEMA with the variants already parsed"""
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(skip_rows=_count_comment_lines(file_path), block_size=block_size),
+        parse_options=pa_csv.ParseOptions(delimiter="\t"),
+        convert_options=pa_csv.ConvertOptions(column_types={
+            "uniprot_id": pa.string(),
+            "protein_variant": pa.string(),
+            "am_pathogenicity": pa.float32(),
+            "am_class": pa.dictionary(pa.int32(), pa.string()),
+        }),
+    )
+    for batch in reader:
+        variants = pc.extract_regex(batch.column("protein_variant"), VARIANT_REGEX)
+        yield pa.record_batch([
+            batch.column("uniprot_id"),
+            batch.column("protein_variant"),
+            batch.column("am_pathogenicity"),
+            batch.column("am_class"),
+            pc.cast(pc.struct_field(variants, "Position"), pa.int32()),
+            pc.struct_field(variants, "Original"),
+            pc.struct_field(variants, "Mutated"),
+            pc.utf8_slice_codeunits(batch.column("uniprot_id"), 0, prefix_length),
+        ], schema=_alphamissense_schema(prefix_length))
+
+
+def _alphamissense_schema(prefix_length: int):
+    return ALPHAMISSENSE_SCHEMA.with_metadata({PREFIX_LENGTH_METADATA: str(prefix_length).encode()})
+
+
+def convert_alphamissense(file_path: str, dataset_path: str, prefix_length: int = DEFAULT_PREFIX_LENGTH):
+    """
+    write an alphamissense tabulated file to the alphamissense parquet dataset of dataset_path, partitioned by the first prefix_length characters of the accession
+    the rows keep the order of the file so the row group statistics of UniprotID let readers skip the row groups of other proteins
+    """
+    ds.write_dataset(
+        iter_alphamissense_record_batches(file_path, prefix_length),
+        os.path.join(dataset_path, ALPHAMISSENSE_DATASET),
+        schema=_alphamissense_schema(prefix_length),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("prefix", pa.string())]), flavor="hive"),
+        existing_data_behavior="delete_matching",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        max_rows_per_group=1 << 17,
+        min_rows_per_group=1 << 14,
+    )
+
+
+def annotation_name(sheet_name: str):
+    """file name used for an annotation sheet, the sheet name in lowercase with runs of other characters replaced by an underscore"""
+    return re.sub(r"[^a-z0-9]+", "_", sheet_name.lower()).strip("_")
+
+
+def convert_annotation_workbook(file_path: str, dataset_path: str, sheets=None):
+    """
+    write every sheet of an excel workbook, or only the given sheets, to its own parquet file in the annotations directory of dataset_path
+    text columns are stored as strings and numeric columns keep the type pandas inferred for them, return the names the sheets were stored under
+    """
+    workbook = pd.read_excel(file_path, sheet_name=sheets or None)
+    os.makedirs(os.path.join(dataset_path, ANNOTATION_DATASET), exist_ok=True)
+    names = {}
+    for sheet_name, df in workbook.items():
+        df = df.copy()
+        for column in df.columns[df.dtypes == object]:
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str)).astype("string")
+        df.columns = [str(column) for column in df.columns]
+        names[sheet_name] = annotation_name(sheet_name)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(dataset_path, ANNOTATION_DATASET, f"{names[sheet_name]}.parquet"), compression="zstd")
+    return names
+
+
+def alphamissense_dataset(dataset_path: str):
+    return ds.dataset(os.path.join(dataset_path, ALPHAMISSENSE_DATASET), format="parquet", partitioning="hive")
+
+
+def read_alphamissense(dataset_path: str, accessions=None, columns=None, filter=None):
+    """
+    read the alphamissense rows of the given accessions from a parquet dataset written by convert_alphamissense
+    only the partitions of the accession prefixes and the row groups whose statistics can hold the accessions are read, columns defaults to all columns but the partition
+    filter is an optional pyarrow expression combined with the accession filter, for example pyarrow.dataset.field("Score") > 0.5
+    """
+    dataset = alphamissense_dataset(dataset_path)
+    expression = filter
+    if accessions is not None:
+        accessions = list(accessions)
+        prefix_length = int((dataset.schema.metadata or {}).get(PREFIX_LENGTH_METADATA, DEFAULT_PREFIX_LENGTH))
+        condition = ds.field("prefix").isin(sorted({accession[:prefix_length] for accession in accessions})) & ds.field("UniprotID").isin(accessions)
+        expression = condition if expression is None else condition & expression
+    table = dataset.to_table(columns=columns or [c for c in ALPHAMISSENSE_SCHEMA.names if c != "prefix"], filter=expression)
+    return table.to_pandas()
+
+
+def read_annotation(dataset_path: str, sheet_name: str, columns=None, filter=None):
+    """
+    read an annotation sheet written by convert_annotation_workbook, sheet_name can be the original sheet name or the name it was stored under
+    text columns are returned as object columns like pandas.read_excel does so the sheets can be used in place of the excel files
+    """
+    dataset = ds.dataset(os.path.join(dataset_path, ANNOTATION_DATASET, f"{annotation_name(sheet_name)}.parquet"), format="parquet")
+    return dataset.to_table(columns=columns, filter=filter).to_pandas(ignore_metadata=True)
@@ -0,0 +1,254 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from uniprotparser.betaparser import UniprotParser
+
+from chorus.alphamissense import AlphaMissenseIndex
+from chorus.figures import COLOR_DISCRETE_MAP, RENDER_MODES, annotation_hover_text, build_variant_figure
+from chorus.parquet import read_alphamissense, read_annotation
+from chorus.utils import extract_functional_domains, extract_variants, functional_domain_lists
+
+# bump when a stage changes the layout of its output so the cached results of older versions are not reused
+PIPELINE_VERSION = 4
+DEFAULT_CACHE_DIR = os.path.join("data", ".chorus_cache")
+UNIPROT_PIPELINE_COLUMNS = "accession,id,ft_domain,sequence"
+# columns of the gnomAD sheet kept for the hover text of the annotated variants
+GNOMAD_COLUMNS = [
+    "SNV Mutation",
+    "ClinVar Clinical Significance",
+    "ClinVar Variation ID",
+    "Allele Count",
+    "Allele Number",
+    "Allele Frequency",
+    "Homozygote Count",
+    "Hemizygote Count",
+]
+# defaults of every protein entry of a pipeline configuration
+PROTEIN_DEFAULTS = {
+    "annotations": None,
+    "gnomad_sheet": "Missense gnomAd",
+    "mds_sheet": "MDSGene classification",
+    "variant_column": "SNV Mutation",
+    "domains": None,
+}
+
+
+def file_fingerprint(path: str):
+    """identify the content of a file, or of every file under a directory, by path, size and modification time without reading it"""
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    return [[f, os.stat(f).st_size, os.stat(f).st_mtime_ns] for f in files]
+
+
+def fingerprint(value):
+    """return a stable digest of a stage input, dataframes are hashed by content and everything else by its json form"""
+    digest = hashlib.sha256()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        columns = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(json.dumps([str(c) for c in columns]).encode())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    class for the on disk cache of the pipeline stages, the output of a stage is stored under a digest of the stage name, PIPELINE_VERSION and its inputs
+    a cache created with enabled False computes every stage again without reading or writing anything
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+
+    def key(self, stage: str, *inputs):
+        return hashlib.sha256(json.dumps([stage, PIPELINE_VERSION, [fingerprint(i) for i in inputs]]).encode()).hexdigest()
+
+    def path(self, stage: str, key: str):
+        return os.path.join(self.cache_dir, stage, f"{key}.pkl")
+
+    def get(self, stage: str, key: str):
+        """return the cached output of a stage or None when it is missing"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path(stage, key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def set(self, stage: str, key: str, value):
+        if not self.enabled:
+            return
+        path = self.path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside and moved in place so concurrent workers never read a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def run(self, stage: str, inputs: list, compute):
+        """return the cached output of a stage for the inputs, computing it with compute(*inputs) and caching it when it is missing"""
+        key = self.key(stage, *inputs)
+        value = self.get(stage, key)
+        if value is None:
+            value = compute(*inputs)
+            self.set(stage, key, value)
+        return value
+
+
+def read_annotation_sheet(path: str, sheet_name: str, columns=None):
+    """read a sheet of an annotation workbook, or of the annotations of a parquet dataset written by convert_to_parquet when path is a directory"""
+    if os.path.isdir(path):
+        return read_annotation(path, sheet_name, columns=columns)
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    return df[columns] if columns else df
+
+
+def prepare_annotations(accession: str, path: str, gnomad_sheet: str, mds_sheet: str, variant_column: str):
+    """merge the gnomAD variants of a protein with their MDSGene classification and build the hover text of every variant"""
+    mds = read_annotation_sheet(path, mds_sheet)
+    mds = mds[pd.notnull(mds["MDSGene"])]
+    gnomad = read_annotation_sheet(path, gnomad_sheet, GNOMAD_COLUMNS)
+    gnomad[variant_column] = gnomad[variant_column].str.upper()
+    gnomad = gnomad.merge(mds, left_on=variant_column, right_on="MDSGene", how="left")
+    gnomad["ClinVar Clinical Significance"] = gnomad["ClinVar Clinical Significance"].fillna("")
+    gnomad["classification"] = gnomad["classification"].fillna("").str.strip()
+    gnomad[["Position", "Original", "Mutated"]] = extract_variants(gnomad[variant_column])
+    gnomad["hover_text"] = annotation_hover_text(gnomad)
+    gnomad["UniprotID"] = accession
+    gnomad["Position"] = gnomad["Position"].astype(int)
+    return gnomad
+
+
+def fetch_uniprot_entries(accessions):
+    """fetch the uniprot entries of the accessions in one batch and return a dictionary from accession to entry with its parsed domains"""
+    parser = UniprotParser(columns=UNIPROT_PIPELINE_COLUMNS)
+    results = [pd.read_csv(io.StringIO(i), sep="\t") for i in parser.parse(list(accessions))]
+    if not results:
+        return {}
+    df = pd.concat(results, ignore_index=True)
+    df["domains"] = functional_domain_lists(extract_functional_domains(df, "Domain [FT]"), df.shape[0])
+    return {row["From"]: row for row in df.to_dict(orient="records")}
+
+
+def uniprot_stage(cache: StageCache, accessions):
+    """return the uniprot entries of the accessions, every entry is cached on its own so only the accessions never seen before are fetched"""
+    entries = {}
+    keys = {accession: cache.key("uniprot", accession, UNIPROT_PIPELINE_COLUMNS) for accession in accessions}
+    for accession, key in keys.items():
+        entry = cache.get("uniprot", key)
+        if entry is not None:
+            entries[accession] = entry
+    missing = [accession for accession in accessions if accession not in entries]
+    if missing:
+        for accession, entry in fetch_uniprot_entries(missing).items():
+            if accession in keys:
+                cache.set("uniprot", keys[accession], entry)
+                entries[accession] = entry
+    return entries
+
+
+@lru_cache(maxsize=4)
+def _alphamissense_index(path: str):
+    return AlphaMissenseIndex.open(path)
+
+
+def read_protein_variants(source: str, accession: str):
+    """read the alphamissense variants of a protein from a parquet dataset directory or an indexed tabulated file"""
+    if os.path.isdir(source):
+        df = read_alphamissense(source, [accession])
+        df["Pathogenicity"] = df["Pathogenicity"].astype(str)
+        # the float32 scores of the dataset go through their shortest text form so they keep the digits of the tabulated file
+        df["Score"] = df["Score"].astype(str).astype(float)
+    else:
+        df = _alphamissense_index(source).read_dataframe([accession])
+        df[["Position", "Original", "Mutated"]] = extract_variants(df["Variant"])
+    df["Position"] = df["Position"].astype(int)
+    # newer alphamissense releases prefix the classes with likely_, the figures use the plain class names
+    df["Pathogenicity"] = df["Pathogenicity"].str.replace("likely_", "", regex=False)
+    return df
+
+
+def merge_variants(variants: pd.DataFrame, annotations):
+    """attach the annotations of the variants, variants without annotations or proteins without an annotations workbook are left with missing annotation columns"""
+    if annotations is None:
+        # object columns like the ones of a left merge so the missing values can be used as dropdown keys
+        return variants.assign(**{
+            column: pd.Series(np.nan, index=variants.index, dtype=object) for column in ("hover_text", "ClinVar Clinical Significance", "classification")
+        })
+    return variants.merge(annotations, on=["UniprotID", "Position", "Original", "Mutated"], how="left")
+
+
+def figure_json(variants: pd.DataFrame, sequence_length: int, domains, options: dict):
+    return build_variant_figure(variants, sequence_length, domains, options["colors"], options["render_mode"]).to_json()
+
+
+def process_protein(cache_dir: str, use_cache: bool, source: str, source_fingerprint, protein: dict, annotations, entry: dict, output_dir: str, options: dict):
+    """run the alphamissense, merge and figure stages of a protein and write its html figure, return the path of the figure"""
+    cache = StageCache(cache_dir, use_cache)
+    accession = protein["accession"]
+    variants = cache.run("alphamissense", [source_fingerprint, accession], lambda _, a: read_protein_variants(source, a))
+    merged = merge_variants(variants, annotations)
+    domains = protein["domains"] if protein["domains"] is not None else entry["domains"]
+    sequence_length = len(entry["Sequence"])
+    figure = cache.run("figure", [merged, sequence_length, domains, options], figure_json)
+    output_path = os.path.join(output_dir, f"{entry['Entry Name']}.html")
+    pio.from_json(figure).write_html(output_path)
+    return output_path
+
+
+def load_config(config_path: str):
+    """read a json pipeline configuration, see run_pipeline for its layout"""
+    with open(config_path) as f:
+        return json.load(f)
+
+
+def run_pipeline(config: dict, workers: int = None, use_cache: bool = True):
+    """
+    build the alphamissense score figures of every protein of a declarative configuration and return a dictionary from accession to the path of its html figure
+    the configuration holds the alphamissense source, a tabulated file or a parquet dataset directory, the output and cache directories, the render mode of chorus.figures.RENDER_MODES and the list of proteins
+    each protein has an accession and optionally an annotations workbook or parquet dataset with its gnomAD and MDSGene sheets and a list of curated domains used instead of the uniprot domains
+    every stage is cached by a digest of its inputs and the proteins are processed in parallel by a pool of workers processes
+    """
+    cache_dir = config.get("cache", DEFAULT_CACHE_DIR)
+    output_dir = config.get("output", "data")
+    options = {"colors": config.get("colors", COLOR_DISCRETE_MAP), "render_mode": config.get("render_mode", "auto")}
+    if options["render_mode"] not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode {options['render_mode']}, expected one of {', '.join(RENDER_MODES)}")
+    source = config["alphamissense"]
+    cache = StageCache(cache_dir, use_cache)
+    proteins = [{**PROTEIN_DEFAULTS, **protein} for protein in config["proteins"]]
+    os.makedirs(output_dir, exist_ok=True)
+
+    entries = uniprot_stage(cache, [protein["accession"] for protein in proteins])
+    source_fingerprint = file_fingerprint(source)
+    jobs = []
+    for protein in proteins:
+        if protein["accession"] not in entries:
+            continue
+        annotations = None
+        if protein["annotations"]:
+            annotations = cache.run(
+                "annotations",
+                [protein["accession"], file_fingerprint(protein["annotations"]), protein["gnomad_sheet"], protein["mds_sheet"], protein["variant_column"]],
+                lambda accession, _, gnomad_sheet, mds_sheet, variant_column: prepare_annotations(accession, protein["annotations"], gnomad_sheet, mds_sheet, variant_column),
+            )
+        jobs.append((cache_dir, use_cache, source, source_fingerprint, protein, annotations, entries[protein["accession"]], output_dir, options))
+
+    if workers == 1 or len(jobs) <= 1:
+        return {job[4]["accession"]: process_protein(*job) for job in jobs}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {job[4]["accession"]: executor.submit(process_protein, *job) for job in jobs}
+        return {accession: future.result() for accession, future in futures.items()}
@@ -0,0 +1,89 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from django.conf import settings
+from django.core.cache import cache
+
+from chorus.figures import build_variant_figure
+from chorus.models import Pathogenicity, ProteinDomain, ProteinVariantMatrix, UniprotEntry, Variant
+from chorus.versioning import get_dataset_version
+
+# options of a protein figure and their defaults, highlight is a list of variants in the form of A123B drawn as annotated points
+FIGURE_OPTION_DEFAULTS = {
+    "render_mode": "auto",
+    "highlight": [],
+    "domains": True,
+    "output": "json",
+}
+
+
+def normalize_figure_options(options: dict):
+    """fill in the defaults of the figure options and put them in a canonical form so equivalent requests share a cache entry"""
+    options = {**FIGURE_OPTION_DEFAULTS, **{k: v for k, v in options.items() if v is not None}}
+    options["highlight"] = sorted({variant.strip().upper() for variant in options["highlight"] if variant.strip()})
+    return options
+
+
+def figure_cache_key(protein, options: dict, version: int):
+    """content address of a figure, the digest of the protein, the dataset version and the normalized options"""
+    content = json.dumps([protein.id, protein.name, version, options], sort_keys=True)
+    return f"figure:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+def protein_variant_frame(protein, highlight):
+    """
+    return the variants of a protein laid out like the merged frames of chorus.pipeline
+    the highlighted variants get a hover text and count as annotated while the others are drawn as variants only in alphamissense
+    """
+    labels = dict(Pathogenicity.choices)
+    df = pd.DataFrame(
+        list(Variant.objects.filter(protein_id=protein.id).order_by("position", "id").values_list("position", "original", "mutated", "score", "pathogenicity")),
+        columns=["Position", "Original", "Mutated", "Score", "Pathogenicity"],
+    )
+    df["Pathogenicity"] = df["Pathogenicity"].map(labels)
+    df["Variant"] = df["Original"] + df["Position"].astype(str) + df["Mutated"]
+    highlighted = df["Variant"].isin(highlight).to_numpy()
+    df["hover_text"] = pd.Series(np.where(highlighted, "Variant: " + df["Variant"], None), index=df.index, dtype=object)
+    df["ClinVar Clinical Significance"] = pd.Series(np.where(highlighted, "", None), index=df.index, dtype=object)
+    df["classification"] = pd.Series(np.where(highlighted, "", None), index=df.index, dtype=object)
+    return df
+
+
+def protein_sequence_length(protein, df: pd.DataFrame):
+    """length of the protein from its uniprot snapshot entry, or from its variants when it has none"""
+    sequence = UniprotEntry.objects.filter(accession=protein.name).values_list("sequence", flat=True).first()
+    if sequence:
+        return len(sequence)
+    length = ProteinVariantMatrix.objects.filter(protein_id=protein.id).values_list("length", flat=True).first()
+    if length:
+        return length
+    return int(df["Position"].max()) if df.shape[0] else 0
+
+
+def render_protein_figure(protein, options: dict):
+    """build the score figure of a protein from the database and return it as plotly json, or as a standalone html page when the output option is html"""
+    df = protein_variant_frame(protein, options["highlight"])
+    domains = []
+    if options["domains"]:
+        domains = list(ProteinDomain.objects.effective().filter(protein_id=protein.id).values("domain", "start", "end"))
+    fig = build_variant_figure(df, protein_sequence_length(protein, df), domains, render_mode=options["render_mode"])
+    if options["output"] == "html":
+        return fig.to_html(include_plotlyjs="cdn")
+    return pio.to_json(fig)
+
+
+def get_protein_figure(protein, options: dict):
+    """
+    return the rendered figure of a protein and its cache key, the figure is built only when no figure was cached for the same protein, dataset version and options
+    figures are stored in the django cache, redis when REDIS_HOST is set, for FIGURE_CACHE_TTL seconds
+    """
+    options = normalize_figure_options(options)
+    key = figure_cache_key(protein, options, get_dataset_version())
+    figure = cache.get(key)
+    if figure is None:
+        figure = render_protein_figure(protein, options)
+        cache.set(key, figure, settings.FIGURE_CACHE_TTL)
+    return figure, key
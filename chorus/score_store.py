@@ -0,0 +1,297 @@
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connections
+from numpy.lib.format import open_memmap
+
+from chorus.matrix import AMINO_ACIDS, MISSING_PATHOGENICITY, load_variant_matrix
+from chorus.models import DatasetVersion, Pathogenicity, Protein, ProteinVariantMatrix, Variant
+from chorus.utils import extract_variants, parse_variant
+from chorus.versioning import VARIANT_SCORES_DATASET, get_dataset_version
+
+# bump when the layout of the store changes so stores written by older versions are refused
+SCORE_STORE_FORMAT = 1
+SCORE_STORE_META = "meta.json"
+# column of every residue of AMINO_ACIDS in the score and pathogenicity arrays
+_residue_column = {residue: i for i, residue in enumerate(AMINO_ACIDS)}
+
+
+def write_score_store(path: str, using: str, batch_size: int = 1000, progress=None):
+    """
+    export the materialized variant matrices of every protein into a read only score store directory
+    the store holds the sorted protein names with their row offsets and one contiguous row per position of every protein in the reference, scores and pathogenicity arrays
+    the store is written aside and moved in place so readers never see a partial store, return the number of proteins written
+    """
+    entries = sorted(ProteinVariantMatrix.objects.using(using).values_list("protein__name", "protein_id", "length"))
+    offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([length for _, _, length in entries])
+    rows = int(offsets[-1])
+    if rows == 0:
+        raise ValueError("There is no materialized protein data to export, build it with the materialize_protein_data command")
+
+    temp_path = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    np.save(os.path.join(temp_path, "names.npy"), np.array([name.encode("ascii") for name, _, _ in entries], dtype="S"))
+    np.save(os.path.join(temp_path, "offsets.npy"), offsets)
+    reference = open_memmap(os.path.join(temp_path, "reference.npy"), mode="w+", dtype=np.uint8, shape=(rows,))
+    scores = open_memmap(os.path.join(temp_path, "scores.npy"), mode="w+", dtype=np.float32, shape=(rows, len(AMINO_ACIDS)))
+    pathogenicity = open_memmap(os.path.join(temp_path, "pathogenicity.npy"), mode="w+", dtype=np.uint8, shape=(rows, len(AMINO_ACIDS)))
+
+    row_of = {protein_id: int(offsets[i]) for i, (_, protein_id, _) in enumerate(entries)}
+    protein_ids = list(row_of)
+    for i in range(0, len(protein_ids), batch_size):
+        for matrix in ProteinVariantMatrix.objects.using(using).filter(protein_id__in=protein_ids[i:i + batch_size]):
+            start = row_of[matrix.protein_id]
+            matrix_scores, matrix_pathogenicity = load_variant_matrix(matrix)
+            reference[start:start + matrix.length] = np.frombuffer(matrix.reference.encode("ascii"), dtype=np.uint8)
+            scores[start:start + matrix.length] = matrix_scores
+            pathogenicity[start:start + matrix.length] = matrix_pathogenicity
+        if progress:
+            progress(min(i + batch_size, len(protein_ids)))
+    for array in (reference, scores, pathogenicity):
+        array.flush()
+    del reference, scores, pathogenicity
+
+    version = DatasetVersion.objects.using(using).filter(name=VARIANT_SCORES_DATASET).values_list("version", flat=True).first() or 0
+    with open(os.path.join(temp_path, SCORE_STORE_META), "w") as f:
+        json.dump({"format": SCORE_STORE_FORMAT, "alphabet": AMINO_ACIDS, "scores_version": version, "proteins": len(entries), "rows": rows}, f)
+
+    # processes that still map the previous store keep reading its unlinked files until they reopen the store
+    old_path = f"{path.rstrip(os.sep)}.{os.getpid()}.old"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(temp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return len(entries)
+
+
+class ScoreStore:
+    """
+    class for reading a score store written by write_score_store, every array is memory mapped so the store is shared by all processes through the page cache
+    the rows of a protein are found by a binary search of its name and the variants of a position range are read from one contiguous slice
+    """
+    def __init__(self, path: str):
+        with open(os.path.join(path, SCORE_STORE_META)) as f:
+            self.meta = json.load(f)
+        if self.meta["format"] != SCORE_STORE_FORMAT or self.meta["alphabet"] != AMINO_ACIDS:
+            raise ValueError(f"The score store at {path} was written in another format, export it again with the export_score_store command")
+        self.path = path
+        # stores exported before the scores were versioned separately have no scores version and are never current
+        self.scores_version = self.meta.get("scores_version")
+        self.names = self._map(path, "names.npy")
+        self.offsets = self._map(path, "offsets.npy")
+        self.reference = self._map(path, "reference.npy")
+        self.scores = self._map(path, "scores.npy")
+        self.pathogenicity = self._map(path, "pathogenicity.npy")
+        self.labels = dict(Pathogenicity.choices)
+
+    @staticmethod
+    def _map(path: str, name: str):
+        # plain ndarray views of the mapped files, slicing numpy.memmap objects costs more than the lookups themselves
+        return np.load(os.path.join(path, name), mmap_mode="r").view(np.ndarray)
+
+    @classmethod
+    def open(cls, path: str):
+        """return the store at path, opened once per process and opened again when the store was exported again"""
+        return _open_score_store(path, os.stat(os.path.join(path, SCORE_STORE_META)).st_mtime_ns)
+
+    def protein_rows(self, protein: str):
+        """return the first row and the length of a protein or None when the store does not hold it"""
+        try:
+            name = protein.encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        i = int(np.searchsorted(self.names, name))
+        if i == len(self.names) or self.names[i] != name:
+            return None
+        return int(self.offsets[i]), int(self.offsets[i + 1] - self.offsets[i])
+
+    def lookup(self, protein: str, position_start: int = None, position_end: int = None, mutated: str = None):
+        """
+        return the variants of a protein between the inclusive positions ordered by position and mutated residue, in the representation of the variant lookup action
+        mutated restricts the variants to one substitution, proteins missing from the store have no variants
+        """
+        rows = self.protein_rows(protein)
+        if rows is None:
+            return []
+        first, length = rows
+        start = max(position_start or 1, 1)
+        end = min(position_end or length, length)
+        if start > end:
+            return []
+        scores = self.scores[first + start - 1:first + end]
+        pathogenicity = self.pathogenicity[first + start - 1:first + end]
+        if mutated is not None:
+            index = AMINO_ACIDS.find(mutated)
+            if len(mutated) != 1 or index < 0:
+                return []
+            row = np.flatnonzero(pathogenicity[:, index] != MISSING_PATHOGENICITY)
+            column = np.full(row.shape, index)
+        else:
+            row, column = np.nonzero(pathogenicity != MISSING_PATHOGENICITY)
+        reference = self.reference[first + start - 1:first + end]
+        return [{
+            "protein": protein,
+            "position": position,
+            "original": chr(original),
+            "mutated": AMINO_ACIDS[c],
+            "score": score,
+            "pathogenicity": self.labels[code],
+        } for position, original, c, score, code in zip(
+            (row + start).tolist(),
+            reference[row].tolist(),
+            column.tolist(),
+            np.round(scores[row, column].astype(np.float64), 4).tolist(),
+            pathogenicity[row, column].tolist(),
+        )]
+
+    def batch_scores(self, items: pd.DataFrame):
+        """
+        return the scores and pathogenicity codes of the parsed variants of items, a frame with the protein, Position, Original and Mutated columns
+        every variant is read with one gather over the arrays, the variants missing from the store or whose original residue differs from the reference get a NaN score and a code of -1
+        """
+        names = items["protein"].str.encode("ascii", errors="replace").to_numpy(dtype="S")
+        index = np.minimum(np.searchsorted(self.names, names), len(self.names) - 1)
+        positions = items["Position"].to_numpy(dtype=np.int64)
+        columns = items["Mutated"].map(_residue_column).fillna(-1).to_numpy(dtype=np.int64)
+        originals = items["Original"].map(lambda residue: ord(residue) if len(residue) == 1 else -1).to_numpy(dtype=np.int64)
+        lengths = self.offsets[index + 1] - self.offsets[index]
+        found = (self.names[index] == names) & (positions >= 1) & (positions <= lengths) & (columns >= 0)
+        rows = np.where(found, self.offsets[index] + positions - 1, 0)
+        columns = np.where(found, columns, 0)
+        found &= self.reference[rows] == originals
+        codes = np.where(found, self.pathogenicity[rows, columns], MISSING_PATHOGENICITY).astype(np.int64)
+        found &= codes != MISSING_PATHOGENICITY
+        scores = np.where(found, np.round(self.scores[rows, columns].astype(np.float64), 4), np.nan)
+        return scores, np.where(found, codes, -1)
+
+
+@lru_cache(maxsize=4)
+def _open_score_store(path: str, stamp: int):
+    return ScoreStore(path)
+
+
+def get_score_store():
+    """return the score store of SCORE_STORE_PATH when it is set and was exported from the current version of the variant scores, None otherwise"""
+    if not settings.SCORE_STORE_PATH or not os.path.exists(os.path.join(settings.SCORE_STORE_PATH, SCORE_STORE_META)):
+        return None
+    store = ScoreStore.open(settings.SCORE_STORE_PATH)
+    if store.scores_version != get_dataset_version(VARIANT_SCORES_DATASET):
+        return None
+    return store
+
+
+def database_lookup(protein: str, position_start: int = None, position_end: int = None, mutated: str = None):
+    """the same lookup as ScoreStore.lookup answered from the variant table"""
+    queryset = Variant.objects.filter(protein__name=protein)
+    if position_start is not None:
+        queryset = queryset.filter(position__gte=position_start)
+    if position_end is not None:
+        queryset = queryset.filter(position__lte=position_end)
+    if mutated is not None:
+        queryset = queryset.filter(mutated=mutated)
+    labels = dict(Pathogenicity.choices)
+    return [{
+        "protein": protein,
+        "position": position,
+        "original": original,
+        "mutated": residue,
+        "score": score,
+        "pathogenicity": labels[code],
+    } for position, original, residue, score, code in queryset.order_by("position", "mutated").values_list(
+        "position", "original", "mutated", "score", "pathogenicity"
+    )]
+
+
+def parse_batch_items(proteins, variants):
+    """return a frame of the protein and variant of every item along with the Position, Original and Mutated columns parsed from the variant, missing when it is not one"""
+    items = pd.DataFrame({"protein": pd.Series(proteins, dtype=object).astype(str).str.strip(), "variant": pd.Series(variants, dtype=object).astype(str).str.strip()})
+    return items.join(extract_variants(items["variant"].str.upper()))
+
+
+def read_batch_file(f):
+    """
+    read the accession and variant columns of a tab separated file of variants, lines starting with # are skipped
+    a first line whose variant column is not a variant is taken as a header, return the accessions and the variants
+    """
+    df = pd.read_csv(f, sep="\t", header=None, usecols=[0, 1], names=["protein", "variant"], dtype=str, comment="#", keep_default_na=False)
+    if df.shape[0] and parse_variant(df["variant"].iloc[0].upper()) is None:
+        df = df.iloc[1:]
+    return df["protein"].tolist(), df["variant"].tolist()
+
+
+def _chunks(values: list, size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def database_batch_scores(items: pd.DataFrame, using: str):
+    """
+    the same lookup as ScoreStore.batch_scores answered from the variant table
+    the distinct variants are joined to the variant table through a VALUES list on the columns of its lookup index, as many at once as the database accepts parameters
+    """
+    connection = connections[using]
+    chunk_size = (connection.features.max_query_params or 65535) // 4
+    names = items["protein"].unique().tolist()
+    protein_ids = {}
+    for chunk in _chunks(names, chunk_size * 4):
+        protein_ids.update(Protein.objects.using(using).filter(name__in=chunk).values_list("name", "id"))
+    keys = items.assign(protein_id=items["protein"].map(protein_ids))
+    keys = keys[keys["protein_id"].notna() & keys["Position"].notna()]
+    keys = list(keys[["protein_id", "Position", "Original", "Mutated"]].drop_duplicates().itertuples(index=False, name=None))
+
+    table = connection.ops.quote_name(Variant._meta.db_table)
+    found = {}
+    with connection.cursor() as cursor:
+        for chunk in _chunks(keys, chunk_size):
+            cursor.execute(
+                f"SELECT v.protein_id, v.position, v.original, v.mutated, v.score, v.pathogenicity FROM {table} v "
+                f"JOIN (VALUES {', '.join(['(%s, %s, %s, %s)'] * len(chunk))}) AS q "
+                f"ON v.protein_id = q.column1 AND v.position = q.column2 AND v.original = q.column3 AND v.mutated = q.column4",
+                [int(value) if i < 2 else value for key in chunk for i, value in enumerate(key)],
+            )
+            for protein_id, position, original, mutated, score, code in cursor.fetchall():
+                found[(protein_id, position, original, mutated)] = (score, code)
+
+    matches = [
+        found.get((protein_ids.get(protein), position, original, mutated), (np.nan, -1))
+        for protein, position, original, mutated in zip(items["protein"], items["Position"].tolist(), items["Original"], items["Mutated"])
+    ]
+    scores = np.array([score for score, _ in matches], dtype=np.float64)
+    codes = np.array([code for _, code in matches], dtype=np.int64)
+    return scores, codes
+
+
+def batch_lookup(proteins, variants, using: str):
+    """
+    look up the score and pathogenicity of every (protein, variant) pair, variants in the form of A123B parsed like the alphamissense files
+    the score store is used when it is current and the variant table otherwise, return the records in the order of the pairs along with the backend used
+    variants that are not found or cannot be parsed have no score and no pathogenicity
+    """
+    items = parse_batch_items(proteins, variants)
+    parsed = items["Position"].notna().to_numpy()
+    scores = np.full(len(items), np.nan)
+    codes = np.full(len(items), -1, dtype=np.int64)
+    store = get_score_store()
+    if parsed.any():
+        lookup = store.batch_scores if store is not None else lambda frame: database_batch_scores(frame, using)
+        scores[parsed], codes[parsed] = lookup(items[parsed].astype({"Position": np.int64}))
+    labels = dict(Pathogenicity.choices)
+    parsed_columns = items[["Position", "Original", "Mutated"]].astype(object).where(pd.Series(parsed, index=items.index), None, axis=0)
+    return [{
+        "protein": protein,
+        "variant": variant,
+        "position": position,
+        "original": original,
+        "mutated": mutated,
+        "score": None if np.isnan(score) else score,
+        "pathogenicity": labels.get(code),
+    } for protein, variant, position, original, mutated, score, code in zip(
+        items["protein"], items["variant"], parsed_columns["Position"].tolist(), parsed_columns["Original"], parsed_columns["Mutated"], scores.tolist(), codes.tolist()
+    )], "store" if store is not None else "database"
@@ -1,33 +1,50 @@
 import os
 
+from django.db.models import F
 from rest_flex_fields import FlexFieldsModelSerializer
 from rest_framework import serializers
 
-from chorus.models import Protein, Variant, ChorusSession
+from chorus.figures import RENDER_MODES
+from chorus.jobs import JOB_KINDS
+from chorus.models import Protein, Variant, ChorusSession, Pathogenicity, ProteinDomain, PATHOGENICITY_CODES
+from chorus.utils import parse_variant
 
+# fields of the variants embedded in proteins, used to prune the columns fetched for them
+PROTEIN_VARIANT_FIELDS = ["protein_id", "position", "original", "mutated", "score", "pathogenicity"]
 
-class ProteinSerializer(FlexFieldsModelSerializer):
-    variants = serializers.SerializerMethodField()
-
-    def get_variants(self, obj):
-        data = []
-        for i in obj.variant_set.all():
-            data.append({
-                "position": i.position,
-                "original": i.original,
-                "mutated": i.mutated,
-                "score": i.score,
-                "pathogenicity": i.pathogenicity
-            })
-        return data
+
+class PathogenicityField(serializers.ChoiceField):
+    """pathogenicity stored as a Pathogenicity code and represented by its class name, the likely_ prefixed names of newer alphamissense releases are accepted too"""
+    def __init__(self, **kwargs):
+        super().__init__(choices=list(PATHOGENICITY_CODES), **kwargs)
+
+    def to_internal_value(self, data):
+        return PATHOGENICITY_CODES[super().to_internal_value(str(data).strip().lower())]
+
+    def to_representation(self, value):
+        return Pathogenicity(value).label
+
+
+class ProteinVariantSerializer(FlexFieldsModelSerializer):
+    pathogenicity = PathogenicityField()
 
+    class Meta:
+        model = Variant
+        fields = ["position", "original", "mutated", "score", "pathogenicity"]
+
+
+class ProteinSerializer(FlexFieldsModelSerializer):
     class Meta:
         model = Protein
-        fields = ["id", "name", "description", "variants"]
+        fields = ["id", "name", "description"]
+        expandable_fields = {
+            "variants": (ProteinVariantSerializer, {"many": True, "source": "variant_set"}),
+        }
 
 
 class VariantSerializer(FlexFieldsModelSerializer):
     protein = serializers.SerializerMethodField()
+    pathogenicity = PathogenicityField()
 
     def get_protein(self, obj):
         return obj.protein.name
@@ -37,6 +54,72 @@ class VariantSerializer(FlexFieldsModelSerializer):
         fields = ["id", "protein", "position", "original", "mutated", "score", "pathogenicity"]
 
 
+def variant_values(queryset):
+    """fetch the fields of VariantSerializer as dictionaries straight from the database without instantiating Variant models"""
+    return queryset.values("id", "protein_id", "position", "original", "mutated", "score", "pathogenicity", protein_name=F("protein__name"))
+
+
+def represent_variant_values(rows):
+    """turn the dictionaries returned by variant_values into the same representation as VariantSerializer"""
+    labels = dict(Pathogenicity.choices)
+    return [{
+        "id": row["id"],
+        "protein": row["protein_name"],
+        "position": row["position"],
+        "original": row["original"],
+        "mutated": row["mutated"],
+        "score": row["score"],
+        "pathogenicity": labels[row["pathogenicity"]],
+    } for row in rows]
+
+
+class ProteinDomainSerializer(FlexFieldsModelSerializer):
+    protein = serializers.SlugRelatedField(slug_field="name", queryset=Protein.objects.all())
+
+    class Meta:
+        model = ProteinDomain
+        fields = ["id", "protein", "domain", "start", "end", "source"]
+
+
+class ProteinPositionSerializer(serializers.Serializer):
+    protein = serializers.CharField()
+    position = serializers.IntegerField(min_value=1)
+
+
+class ProteinFigureOptionsSerializer(serializers.Serializer):
+    render_mode = serializers.ChoiceField(choices=RENDER_MODES, required=False)
+    highlight = serializers.CharField(required=False, allow_blank=True)
+    domains = serializers.BooleanField(required=False, default=True)
+    output = serializers.ChoiceField(choices=["json", "html"], required=False)
+
+    def validate_highlight(self, value):
+        variants = [variant.strip() for variant in value.split(",") if variant.strip()]
+        for variant in variants:
+            if parse_variant(variant.upper()) is None:
+                raise serializers.ValidationError(f"{variant} is not a variant in the form of A123B")
+        return variants
+
+
+class JobSubmitSerializer(serializers.Serializer):
+    # field each kind of job requires, the accession of the protein or the path of the file to load on the server
+    required_fields = {"uniprot": "protein", "figure": "protein", "ingest_alphamissense": "file_path"}
+
+    kind = serializers.ChoiceField(choices=JOB_KINDS)
+    protein = serializers.CharField(required=False)
+    options = ProteinFigureOptionsSerializer(required=False)
+    file_path = serializers.CharField(required=False)
+    method = serializers.ChoiceField(choices=["auto", "bulk", "copy"], required=False, default="auto")
+    materialize = serializers.BooleanField(required=False, default=True)
+
+    def validate(self, data):
+        field = self.required_fields[data["kind"]]
+        if not data.get(field):
+            raise serializers.ValidationError({field: f"This field is required for {data['kind']} jobs"})
+        if data["kind"] == "ingest_alphamissense" and not os.path.isfile(data["file_path"]):
+            raise serializers.ValidationError({"file_path": f"{data['file_path']} is not a file on the server"})
+        return data
+
+
 class ChorusSessionSerializer(FlexFieldsModelSerializer):
     file = serializers.SerializerMethodField()
 
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'drf_spectacular',
     'dbbackup',
     'storages',
+    'django_rq',
     'chorus'
 ]
 
@@ -109,7 +110,81 @@ if os.getenv("POSTGRES_NAME"):
         'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
         'PORT': int(os.environ.get('POSTGRES_PORT', '5432')),
     }
+# If POSTGRES_VARIANT_NAME found in environment variables, store protein and variant data in postgresql database
+if os.getenv("POSTGRES_VARIANT_NAME"):
+    DATABASES['variant'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_VARIANT_NAME', 'chorus_variant'),
+        'USER': os.environ.get('POSTGRES_USER', 'admin'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', "testpostgrest"),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': int(os.environ.get('POSTGRES_PORT', '5432')),
+    }
+
+# Cache
+# If REDIS_HOST found in environment variables, use the redis server as django cache through django-redis
+if os.getenv("REDIS_HOST"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': f"redis://{os.environ.get('REDIS_HOST')}:{os.environ.get('REDIS_PORT', '6379')}/1",
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'PASSWORD': os.environ.get('REDIS_PASSWORD', None),
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# UniProt
+# remote queries the uniprot rest api while local answers from the snapshot imported with the import_uniprot_snapshot command
+UNIPROT_BACKEND = os.getenv("UNIPROT_BACKEND", "remote")
+UNIPROT_CACHE_TTL = int(os.getenv("UNIPROT_CACHE_TTL", str(60 * 60 * 24 * 7)))
+
+# Dataset versions and figures
+# the dataset version is cached for DATASET_VERSION_CACHE_TTL seconds, rendered figures are cached under the version for FIGURE_CACHE_TTL seconds
+DATASET_VERSION_CACHE_TTL = int(os.getenv("DATASET_VERSION_CACHE_TTL", "60"))
+FIGURE_CACHE_TTL = int(os.getenv("FIGURE_CACHE_TTL", str(60 * 60 * 24 * 7)))
+# protein and variant api responses are cached under the version for RESPONSE_CACHE_TTL seconds and clients may reuse them for RESPONSE_CACHE_MAX_AGE seconds before revalidating their etag
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(60 * 60 * 24)))
+RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "0"))
+
+# Background jobs
+# If REDIS_HOST found in environment variables, jobs are queued on the redis server and run by python manage.py rqworker default
+# otherwise they run synchronously when submitted against an in memory fakeredis server so they also work in tests
+if os.getenv("REDIS_HOST"):
+    RQ_QUEUES = {
+        'default': {
+            'HOST': os.environ.get('REDIS_HOST'),
+            'PORT': int(os.environ.get('REDIS_PORT', '6379')),
+            'DB': 0,
+            'PASSWORD': os.environ.get('REDIS_PASSWORD', None),
+            'DEFAULT_TIMEOUT': int(os.getenv("JOB_TIMEOUT", str(60 * 60 * 6))),
+        }
+    }
+    RQ_FAKE_REDIS = False
+else:
+    RQ_QUEUES = {
+        'default': {
+            'HOST': 'localhost',
+            'PORT': 6379,
+            'DB': 0,
+            'ASYNC': False,
+        }
+    }
+    RQ_FAKE_REDIS = True
+# finished jobs and their results are kept for JOB_RESULT_TTL seconds, identical submissions in that time get the same job back
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(60 * 60 * 24)))
 
+# Score store
+# directory of the memory mapped score store written by the export_score_store command, when set the variant lookup action reads from it
+# as long as it was exported from the current version of the variant scores and falls back to the database otherwise
+SCORE_STORE_PATH = os.getenv("SCORE_STORE_PATH", None)
 
 
 # Password validation
@@ -172,7 +247,7 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'chorus.pagination.ChorusPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
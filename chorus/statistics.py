@@ -0,0 +1,185 @@
+import numpy as np
+from django.db.models import Avg, Count, ExpressionWrapper, F, IntegerField, Max, Min, Sum
+
+from chorus.models import Pathogenicity
+
+# columns of the score bands returned by the api, position is the first position of every bin
+SCORE_BAND_FIELDS = ["position", "min", "mean", "max", "count"]
+# number of equal score bins between 0 and 1 stored in the histogram of a ProteinSummary, histograms can be requested with any number of bins dividing it
+SUMMARY_HISTOGRAM_BINS = 100
+# columns of the per position statistics returned by the summary action
+SUMMARY_POSITION_FIELDS = ["position", "min", "mean", "max", "benign", "ambiguous", "pathogenic"]
+# scores are returned with the 4 decimals of alphamissense
+SCORE_DECIMALS = 4
+
+
+def variant_score_bands(queryset, bin_size: int = 1):
+    """
+    aggregate the scores of a variant queryset into the minimum, mean and maximum score and the number of variants of every bin of bin_size positions with a single grouped query
+    return one list per SCORE_BAND_FIELDS ordered by position so the bands can be handed to plotly as they are
+    """
+    rows = queryset.annotate(
+        bin=ExpressionWrapper((F("position") - 1) / bin_size, output_field=IntegerField())
+    ).order_by().values("bin").annotate(
+        min=Min("score"), mean=Avg("score"), max=Max("score"), count=Count("id")
+    ).order_by("bin").values_list("bin", "min", "mean", "max", "count")
+    bands = {field: [] for field in SCORE_BAND_FIELDS}
+    for bin_index, minimum, mean, maximum, count in rows:
+        bands["position"].append(bin_index * bin_size + 1)
+        bands["min"].append(minimum)
+        bands["mean"].append(mean)
+        bands["max"].append(maximum)
+        bands["count"].append(count)
+    return bands
+
+
+def build_protein_summary(positions, scores, pathogenicity):
+    """
+    compute the fields of the ProteinSummary of a protein from the columns of its variants
+    return the protein level statistics along with the per position score and class count arrays and the score histogram as bytes
+    """
+    rows = np.asarray(positions, dtype=np.int64) - 1
+    scores = np.asarray(scores, dtype=np.float64)
+    codes = np.asarray(pathogenicity, dtype=np.int64)
+    length = int(rows.max()) + 1
+    counts = np.zeros((length, len(Pathogenicity)), dtype=np.uint16)
+    np.add.at(counts, (rows, codes), 1)
+    total = counts.sum(axis=1)
+    minimum = np.full(length, np.inf)
+    np.minimum.at(minimum, rows, scores)
+    maximum = np.full(length, -np.inf)
+    np.maximum.at(maximum, rows, scores)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(rows, weights=scores, minlength=length) / total
+    position_scores = np.column_stack([minimum, mean, maximum])
+    position_scores[total == 0] = np.nan
+    class_counts = np.bincount(codes, minlength=len(Pathogenicity))
+    return {
+        "length": length,
+        "variant_count": len(scores),
+        "min_score": float(scores.min()),
+        "mean_score": float(scores.mean()),
+        "max_score": float(scores.max()),
+        "benign_count": int(class_counts[Pathogenicity.BENIGN]),
+        "ambiguous_count": int(class_counts[Pathogenicity.AMBIGUOUS]),
+        "pathogenic_count": int(class_counts[Pathogenicity.PATHOGENIC]),
+        "position_scores": position_scores.astype(np.float32).tobytes(),
+        "position_counts": counts.tobytes(),
+        "histogram": score_histogram(scores).tobytes(),
+    }
+
+
+def score_histogram(scores):
+    """
+    count the scores in each of the SUMMARY_HISTOGRAM_BINS equal bins between 0 and 1, bins include their lower edge and the last bin also includes 1
+    scores are binned from their 4 decimals in integer arithmetic so a score lying on an edge always lands in the bin it starts
+    """
+    scaled = np.round(np.asarray(scores, dtype=np.float64) * 10 ** SCORE_DECIMALS).astype(np.int64)
+    index = np.clip(scaled * SUMMARY_HISTOGRAM_BINS // 10 ** SCORE_DECIMALS, 0, SUMMARY_HISTOGRAM_BINS - 1)
+    return np.bincount(index, minlength=SUMMARY_HISTOGRAM_BINS).astype(np.int32)
+
+
+def load_summary_arrays(summary):
+    """return the per position score and class count arrays stored in a ProteinSummary, with one row per position"""
+    scores = np.frombuffer(bytes(summary.position_scores), dtype=np.float32).reshape(summary.length, 3)
+    counts = np.frombuffer(bytes(summary.position_counts), dtype=np.uint16).reshape(summary.length, len(Pathogenicity))
+    return scores, counts
+
+
+def _round_scores(values):
+    return np.where(np.isnan(values), None, np.round(values.astype(np.float64), SCORE_DECIMALS)).tolist()
+
+
+def _position_range(summary, position_start: int = None, position_end: int = None):
+    start = max(position_start or 1, 1)
+    end = min(position_end or summary.length, summary.length)
+    return start, end
+
+
+def summary_positions(summary, position_start: int = None, position_end: int = None):
+    """return one list per SUMMARY_POSITION_FIELDS for every position between the inclusive positions, positions without variants have no scores"""
+    scores, counts = load_summary_arrays(summary)
+    start, end = _position_range(summary, position_start, position_end)
+    scores = scores[start - 1:end]
+    counts = counts[start - 1:end].astype(np.int64)
+    return {
+        "position": list(range(start, end + 1)),
+        "min": _round_scores(scores[:, 0]),
+        "mean": _round_scores(scores[:, 1]),
+        "max": _round_scores(scores[:, 2]),
+        "benign": counts[:, Pathogenicity.BENIGN].tolist(),
+        "ambiguous": counts[:, Pathogenicity.AMBIGUOUS].tolist(),
+        "pathogenic": counts[:, Pathogenicity.PATHOGENIC].tolist(),
+    }
+
+
+def protein_summary(summary, position_start: int = None, position_end: int = None):
+    """return the protein level statistics of a ProteinSummary along with its per position statistics between the inclusive positions"""
+    return {
+        "length": summary.length,
+        "variant_count": summary.variant_count,
+        "min_score": round(summary.min_score, SCORE_DECIMALS),
+        "mean_score": round(summary.mean_score, SCORE_DECIMALS),
+        "max_score": round(summary.max_score, SCORE_DECIMALS),
+        "benign": summary.benign_count,
+        "ambiguous": summary.ambiguous_count,
+        "pathogenic": summary.pathogenic_count,
+        "positions": summary_positions(summary, position_start, position_end),
+    }
+
+
+def summary_score_bands(summary, bin_size: int = 1, position_start: int = None, position_end: int = None):
+    """the same bands as variant_score_bands computed from the per position statistics of a ProteinSummary, bins without variants are left out"""
+    scores, counts = load_summary_arrays(summary)
+    start, end = _position_range(summary, position_start, position_end)
+    bands = {field: [] for field in SCORE_BAND_FIELDS}
+    if start > end:
+        return bands
+    positions = np.arange(start, end + 1)
+    scores = scores[start - 1:end].astype(np.float64)
+    total = counts[start - 1:end].sum(axis=1).astype(np.int64)
+    present = total > 0
+    if not present.any():
+        return bands
+    bins = (positions[present] - 1) // bin_size
+    bin_index, first = np.unique(bins, return_index=True)
+    count = np.add.reduceat(total[present], first)
+    bands["position"] = (bin_index * bin_size + 1).tolist()
+    bands["min"] = _round_scores(np.minimum.reduceat(scores[present, 0], first))
+    bands["mean"] = _round_scores(np.add.reduceat(scores[present, 1] * total[present], first) / count)
+    bands["max"] = _round_scores(np.maximum.reduceat(scores[present, 2], first))
+    bands["count"] = count.tolist()
+    return bands
+
+
+def summary_histogram(histograms, bins: int = SUMMARY_HISTOGRAM_BINS):
+    """
+    add up the stored histograms of any number of ProteinSummary and merge their bins into bins equal bins, bins has to divide SUMMARY_HISTOGRAM_BINS
+    return the bin edges and the number of variants of every bin
+    """
+    if bins < 1 or SUMMARY_HISTOGRAM_BINS % bins:
+        raise ValueError(f"The number of bins has to divide {SUMMARY_HISTOGRAM_BINS}")
+    total = np.zeros(SUMMARY_HISTOGRAM_BINS, dtype=np.int64)
+    for histogram in histograms:
+        total += np.frombuffer(bytes(histogram), dtype=np.int32)
+    return {
+        "edges": np.round(np.linspace(0, 1, bins + 1), 6).tolist(),
+        "counts": total.reshape(bins, -1).sum(axis=1).tolist(),
+    }
+
+
+def proteome_summary(queryset):
+    """aggregate the protein level statistics of a ProteinSummary queryset with a single query, the mean score is weighted by the number of variants of every protein"""
+    totals = queryset.aggregate(
+        proteins=Count("id"),
+        variants=Sum("variant_count"),
+        min_score=Min("min_score"),
+        max_score=Max("max_score"),
+        score_sum=Sum(F("mean_score") * F("variant_count")),
+        benign=Sum("benign_count"),
+        ambiguous=Sum("ambiguous_count"),
+        pathogenic=Sum("pathogenic_count"),
+    )
+    score_sum = totals.pop("score_sum")
+    totals["mean_score"] = round(score_sum / totals["variants"], SCORE_DECIMALS) if totals["variants"] else None
+    return totals
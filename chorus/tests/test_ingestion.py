@@ -0,0 +1,102 @@
+import io
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from chorus.ingestion import create_ingest_checkpoints, load_alphamissense_shard, parse_alphamissense_block
+from chorus.models import IngestCheckpoint, Pathogenicity, Protein, ProteinSummary, ProteinVariantMatrix, Variant
+
+HEADER = "# Copyright 2023 DeepMind Technologies Limited\n#\n# Licensed under CC BY-NC-SA 4.0 license\nuniprot_id\tprotein_variant\tam_pathogenicity\tam_class\n"
+
+
+class ParseAlphamissenseBlockTest(TestCase):
+    def test_parse(self):
+        table = parse_alphamissense_block(b"P1\tA1C\t0.5\tambiguous\r\nP1\tjunk\t0.1\tbenign\nP2\tM3W\t0.25\tlikely_pathogenic\nshort\n")
+        self.assertEqual(table.to_pylist(), [
+            {"protein": "P1", "position": 1, "original": "A", "mutated": "C", "score": 0.5, "pathogenicity": Pathogenicity.AMBIGUOUS},
+            {"protein": "P2", "position": 3, "original": "M", "mutated": "W", "score": 0.25, "pathogenicity": Pathogenicity.PATHOGENIC},
+        ])
+
+    def test_unknown_class(self):
+        with self.assertRaises(ValueError):
+            parse_alphamissense_block(b"P1\tA1C\t0.5\tunknown\n")
+
+
+class LoadAlphamissenseTest(TestCase):
+    """batches do not have to hold all variants of a protein, an interrupted load resumes from its checkpoint and the protein data is built afterward"""
+    databases = {"default", "variant"}
+
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False)
+        self.addCleanup(os.remove, f.name)
+        with f:
+            f.write(HEADER)
+            for protein in ("P00001", "P00002", "P00003"):
+                for position in range(1, 11):
+                    for mutated in "CDE":
+                        f.write(f"{protein}\tA{position}{mutated}\t{position / 10:.4f}\tlikely_benign\n")
+        self.file_path = f.name
+
+    def test_resume(self):
+        checkpoint = create_ingest_checkpoints(self.file_path, 1)[0]
+
+        def interrupt(total):
+            if total >= 40:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            load_alphamissense_shard(checkpoint.id, 20, "bulk", progress=interrupt)
+        checkpoint = IngestCheckpoint.objects.get(id=checkpoint.id)
+        self.assertEqual(Variant.objects.count(), 40)
+        self.assertEqual(checkpoint.protein, "P00002")
+        self.assertFalse(checkpoint.completed)
+
+        call_command("load_alphamissense", self.file_path, batch_size=20, stdout=io.StringIO())
+        self.assertEqual(Variant.objects.count(), 90)
+        self.assertEqual(Variant.objects.values("protein_id", "position", "mutated").distinct().count(), 90)
+        self.assertEqual(ProteinVariantMatrix.objects.count(), 3)
+        self.assertEqual(list(ProteinSummary.objects.values_list("variant_count", flat=True)), [30, 30, 30])
+
+    def test_restart(self):
+        call_command("load_alphamissense", self.file_path, batch_size=20, stdout=io.StringIO())
+        call_command("load_alphamissense", self.file_path, batch_size=20, restart=True, stdout=io.StringIO())
+        self.assertEqual(Variant.objects.count(), 90)
+        self.assertEqual(ProteinVariantMatrix.objects.count(), 3)
+
+        with open(self.file_path, "a") as f:
+            f.write("P00004\tA1C\t0.5000\tlikely_benign\n")
+        with self.assertRaises(CommandError):
+            call_command("load_alphamissense", self.file_path, batch_size=20, stdout=io.StringIO())
+        self.assertEqual(Variant.objects.count(), 90)
+
+    def test_summary_endpoints(self):
+        call_command("load_alphamissense", self.file_path, batch_size=20, stdout=io.StringIO())
+        client = APIClient()
+        protein_id = Protein.objects.get(name="P00002").id
+
+        summary = client.get(f"/api/protein/{protein_id}/summary/?position_start=2&position_end=3").json()
+        self.assertEqual(
+            {key: summary[key] for key in ("protein", "length", "variant_count", "min_score", "mean_score", "max_score", "benign", "ambiguous", "pathogenic")},
+            {"protein": "P00002", "length": 10, "variant_count": 30, "min_score": 0.1, "mean_score": 0.55, "max_score": 1.0, "benign": 30, "ambiguous": 0, "pathogenic": 0},
+        )
+        self.assertEqual(summary["positions"]["position"], [2, 3])
+        self.assertEqual(summary["positions"]["mean"], [0.2, 0.3])
+
+        bands = client.get(f"/api/protein/{protein_id}/score_bands/?bin=5").json()
+        self.assertEqual(bands["position"], [1, 6])
+        self.assertEqual(bands["count"], [15, 15])
+        self.assertEqual(bands["mean"], [0.3, 0.8])
+
+        histogram = client.get(f"/api/protein/{protein_id}/histogram/?bins=10").json()
+        self.assertEqual(len(histogram["edges"]), 11)
+        self.assertEqual(sum(histogram["counts"]), 30)
+        self.assertEqual(client.get(f"/api/protein/{protein_id}/histogram/?bins=7").status_code, 400)
+
+        proteome = client.get("/api/protein/proteome_summary/").json()
+        self.assertEqual((proteome["proteins"], proteome["variants"], proteome["benign"], proteome["mean_score"]), (3, 90, 90, 0.55))
+        proteome_histogram = client.get("/api/protein/proteome_histogram/?bins=4").json()
+        self.assertEqual(proteome_histogram["edges"], [0.0, 0.25, 0.5, 0.75, 1.0])
+        self.assertEqual(sum(proteome_histogram["counts"]), 90)
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+
+import pyarrow.parquet as pq
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from chorus.models import Pathogenicity, Protein, Variant
+from chorus.versioning import bump_dataset_version
+
+
+class QueryCountTest(TestCase):
+    """pin the number of queries of the protein and variant endpoints so they do not grow with the number of rows on a page"""
+    databases = {"default", "variant"}
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            protein = Protein.objects.create(name=f"P{i:05d}", description="")
+            Variant.objects.bulk_create([
+                Variant(protein=protein, position=position, original="A", mutated=mutated, score=0.5, pathogenicity=Pathogenicity.AMBIGUOUS)
+                for position in range(1, 4) for mutated in "CDE"
+            ])
+        cls.protein_id = protein.id
+
+    def setUp(self):
+        # responses and the dataset version are cached, start every test from an empty cache so the view runs its queries
+        cache.clear()
+        self.client = APIClient()
+
+    def assertQueries(self, count, url):
+        # one query reads the dataset version the responses are cached under
+        with self.assertNumQueries(count + 1, using="variant"):
+            response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_protein_list(self):
+        data = self.assertQueries(2, "/api/protein/")
+        self.assertEqual(len(data["results"]), 5)
+
+    def test_protein_list_with_variants(self):
+        data = self.assertQueries(3, "/api/protein/?expand=variants")
+        self.assertEqual([len(protein["variants"]) for protein in data["results"]], [9] * 5)
+
+    def test_protein_detail_with_variants(self):
+        data = self.assertQueries(2, f"/api/protein/{self.protein_id}/?expand=variants")
+        self.assertEqual(len(data["variants"]), 9)
+        self.assertEqual(data["variants"][0]["pathogenicity"], "ambiguous")
+
+    def test_variant_list(self):
+        data = self.assertQueries(2, "/api/variant/?limit=20")
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(data["results"][0]["protein"], "P00000")
+
+    def test_variant_list_serializer(self):
+        data = self.assertQueries(2, "/api/variant/?limit=20&fields=id,protein,pathogenicity")
+        self.assertEqual(len(data["results"]), 20)
+        self.assertEqual(data["results"][0]["protein"], "P00000")
+
+    def test_variant_list_cursor(self):
+        data = self.assertQueries(1, "/api/variant/?limit=20&pagination=cursor")
+        self.assertEqual(len(data["results"]), 20)
+        ids = [variant["id"] for variant in data["results"]]
+        while data["next"]:
+            # the dataset version is cached by the first page
+            with self.assertNumQueries(1, using="variant"):
+                data = self.client.get(data["next"], HTTP_ACCEPT="application/json").json()
+            ids += [variant["id"] for variant in data["results"]]
+        self.assertEqual(ids, list(Variant.objects.order_by("protein_id", "position", "id").values_list("id", flat=True)))
+
+    def test_variant_export(self):
+        expected = list(Variant.objects.filter(protein__name="P00001").order_by("id").values_list("id", flat=True))
+        for output in ("csv", "ndjson", "parquet"):
+            with self.subTest(output=output):
+                with self.assertNumQueries(1, using="variant"):
+                    response = self.client.get(f"/api/variant/export/?output={output}&protein=P00001")
+                    content = b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(f'filename="variants.{output}"', response["Content-Disposition"])
+                if output == "csv":
+                    rows = list(csv.DictReader(io.StringIO(content.decode())))
+                elif output == "ndjson":
+                    rows = [json.loads(line) for line in content.decode().splitlines()]
+                else:
+                    rows = pq.read_table(io.BytesIO(content)).to_pylist()
+                self.assertEqual(sorted(int(row["id"]) for row in rows), expected)
+                self.assertEqual({(row["protein"], row["original"], row["pathogenicity"]) for row in rows}, {("P00001", "A", "ambiguous")})
+                self.assertEqual({float(row["score"]) for row in rows}, {0.5})
+        self.assertEqual(self.client.get("/api/variant/export/?output=xlsx").status_code, 400)
+
+    def test_response_cache(self):
+        url = "/api/variant/?limit=100&protein=P00001"
+        first = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(len(first.json()["results"]), 9)
+        etag = first["ETag"]
+        self.assertIn("max-age", first["Cache-Control"])
+        self.assertIn("Accept", first["Vary"])
+
+        # the cached response is served without the view running
+        with self.assertNumQueries(0, using="variant"):
+            second = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], etag)
+        with self.assertNumQueries(0, using="variant"):
+            response = self.client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # a new version of the dataset invalidates the cached responses and their etags
+        with self.captureOnCommitCallbacks(using="variant", execute=True):
+            Variant.objects.create(protein_id=Protein.objects.get(name="P00001").id, position=4, original="A", mutated="C", score=0.5, pathogenicity=Pathogenicity.AMBIGUOUS)
+            bump_dataset_version(using="variant")
+        response = self.client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 10)
+        self.assertNotEqual(response["ETag"], etag)
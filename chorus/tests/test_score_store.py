@@ -0,0 +1,73 @@
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from chorus.ingestion import VariantBulkWriter, materialize_protein_ids, parse_alphamissense_block
+from chorus.models import ProteinDomain
+from chorus.score_store import get_score_store, write_score_store
+from chorus.versioning import VARIANT_SCORES_DATASET, bump_dataset_version
+
+
+class ScoreStoreVersionTest(TestCase):
+    """the score store stays current through domain changes and is only outdated by changes to the variant scores"""
+    databases = {"default", "variant"}
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        store_path = f"{directory.name}/store"
+        settings = override_settings(SCORE_STORE_PATH=store_path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        writer = VariantBulkWriter(method="bulk")
+        with self.captureOnCommitCallbacks(using="variant", execute=True):
+            writer.write(parse_alphamissense_block("".join(f"P00001\tA{position}C\t0.5\tambiguous\n" for position in range(1, 11)).encode()))
+            materialize_protein_ids(writer.protein_ids)
+        write_score_store(store_path, writer.using)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin"))
+
+    def test_domain_changes_keep_the_store(self):
+        with self.captureOnCommitCallbacks(using="variant", execute=True):
+            response = self.client.post("/api/protein_domain/", {"protein": "P00001", "domain": "Kinase", "start": 1, "end": 5, "source": "curated"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProteinDomain.objects.count(), 1)
+        self.assertIsNotNone(get_score_store())
+        response = self.client.get("/api/variant/lookup/?protein=P00001&position=3")
+        self.assertEqual(response["X-Variant-Backend"], "store")
+        self.assertEqual(response.json()[0]["score"], 0.5)
+
+    def test_variant_changes_outdate_the_store(self):
+        self.assertIsNotNone(get_score_store())
+        with self.captureOnCommitCallbacks(using="variant", execute=True):
+            VariantBulkWriter(method="bulk").write(parse_alphamissense_block(b"P00002\tM1A\t0.9\tlikely_pathogenic\n"))
+        self.assertIsNone(get_score_store())
+        response = self.client.get("/api/variant/lookup/?protein=P00002&position=1")
+        self.assertEqual(response["X-Variant-Backend"], "database")
+        self.assertEqual(response.json()[0]["pathogenicity"], "pathogenic")
+
+
+    def test_batch_lookup(self):
+        items = [["P00001", "A3C"], {"protein": "P00001", "variant": "a10c"}, ["P00001", "G3C"], ["P00001", "junk"], ["P00009", "A1C"]]
+        response = self.client.post("/api/variant/batch_lookup/", items, format="json")
+        self.assertEqual(response["X-Variant-Backend"], "store")
+        results = response.json()
+        self.assertEqual(results[0], {"protein": "P00001", "variant": "A3C", "position": 3, "original": "A", "mutated": "C", "score": 0.5, "pathogenicity": "ambiguous"})
+        self.assertEqual([result["score"] for result in results], [0.5, 0.5, None, None, None])
+        self.assertEqual([result["position"] for result in results], [3, 10, 3, None, 1])
+
+        # the variant table answers the same once the store is outdated
+        with self.captureOnCommitCallbacks(using="variant", execute=True):
+            bump_dataset_version(VARIANT_SCORES_DATASET, using="variant")
+        response = self.client.post("/api/variant/batch_lookup/", items, format="json")
+        self.assertEqual(response["X-Variant-Backend"], "database")
+        self.assertEqual(response.json(), results)
+
+        batch_file = SimpleUploadedFile("variants.tsv", b"# variants\naccession\tvariant\nP00001\tA3C\nP00009\tA1C\n")
+        response = self.client.post("/api/variant/batch_lookup/", {"file": batch_file}, format="multipart")
+        self.assertEqual(response.json(), [results[0], results[4]])
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from chorus.models import Pathogenicity, Protein, Variant
+
+
+class VariantPathogenicityTest(TestCase):
+    """pathogenicity is represented by its class name and can be written back with it"""
+    databases = {"default", "variant"}
+
+    def setUp(self):
+        protein = Protein.objects.create(name="P00001", description="")
+        self.variant = Variant.objects.create(protein=protein, position=1, original="A", mutated="C", score=0.5, pathogenicity=Pathogenicity.AMBIGUOUS)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin"))
+
+    def test_update(self):
+        response = self.client.patch(f"/api/variant/{self.variant.id}/", {"pathogenicity": "likely_pathogenic"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pathogenicity"], "pathogenic")
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.pathogenicity, Pathogenicity.PATHOGENIC)
+
+    def test_invalid_class(self):
+        response = self.client.patch(f"/api/variant/{self.variant.id}/", {"pathogenicity": "harmless"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pathogenicity", response.json())
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.pathogenicity, Pathogenicity.AMBIGUOUS)
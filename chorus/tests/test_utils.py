@@ -0,0 +1,65 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from chorus.utils import extract_functional_domains, functional_domain_lists
+
+
+def legacy_extract_functional_domain(row: pd.Series, domain_column_name: str):
+    """the row wise parser scratch.py used before extract_functional_domains, kept to check that both give the same domains"""
+    domains = []
+    if pd.notnull(row[domain_column_name]):
+        current_domain = ""
+        current_domain_start = ""
+        current_domain_end = ""
+        previous_domain_end = None
+        for i in row[domain_column_name].split(";"):
+            i = i.strip()
+            if i.startswith("DOMAIN"):
+                if current_domain:
+                    domains.append({"domain": current_domain, "start": current_domain_start, "end": current_domain_end})
+                current_domain = ""
+                splitted_start_end = i.replace("DOMAIN", "").strip().split("..")
+                try:
+                    current_domain_start = int(splitted_start_end[0])
+                    if previous_domain_end is None:
+                        if current_domain_start > 1:
+                            domains.append({"domain": "Other", "start": 1, "end": current_domain_start - 1})
+                    elif (current_domain_start - previous_domain_end) > 1:
+                        domains.append({"domain": "Other", "start": previous_domain_end + 1, "end": current_domain_start - 1})
+                except ValueError:
+                    current_domain_start = None
+                try:
+                    current_domain_end = int(splitted_start_end[1])
+                    previous_domain_end = int(splitted_start_end[1])
+                except ValueError:
+                    current_domain_end = None
+            elif i.startswith("/note="):
+                current_domain = i.replace("/note=", "").replace("\"", "").strip()
+        if current_domain != "":
+            domains.append({"domain": current_domain, "start": current_domain_start, "end": current_domain_end})
+        if previous_domain_end is None or previous_domain_end < len(row["Sequence"]):
+            domains.append({"domain": "Other", "start": current_domain_end + 1, "end": len(row["Sequence"])})
+    row["domains"] = domains
+    return row
+
+
+class ExtractFunctionalDomainsTest(SimpleTestCase):
+    """the vectorized extract_functional_domains gives the same domains as the legacy row wise parser"""
+    def test_legacy_equivalence(self):
+        df = pd.DataFrame({
+            "Entry": ["P00001", "P00002", "P00003", "P00004", "P00005"],
+            "Domain [FT]": [
+                # gaps before, between and after the domains
+                'DOMAIN 10..50; /note="Kinase"; /evidence="ECO:0000255"; DOMAIN 60..80; /note="SH2"',
+                # adjacent domains that start at the first residue and end at the last one
+                'DOMAIN 1..40; /note="ARM"; DOMAIN 41..70; /note="ANK"; DOMAIN 71..100; /note="LRR"',
+                # overlapping domains, the second one starts before the first one ends
+                'DOMAIN 5..60; /note="PH"; DOMAIN 40..90; /note="C2"; DOMAIN 85..95; /note="PDZ"',
+                # a domain nested inside the previous one
+                'DOMAIN 2..80; /note="WD40"; DOMAIN 20..30; /note="ZF"',
+                None,
+            ],
+            "Sequence": ["A" * 100, "A" * 100, "A" * 120, "A" * 90, "A" * 50],
+        })
+        expected = [legacy_extract_functional_domain(row.copy(), "Domain [FT]")["domains"] for _, row in df.iterrows()]
+        self.assertEqual(functional_domain_lists(extract_functional_domains(df, "Domain [FT]"), df.shape[0]), expected)
@@ -0,0 +1,75 @@
+import io
+
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from uniprotparser.betaparser import UniprotParser
+
+from chorus.models import UniprotEntry
+from chorus.utils import extract_functional_domains, functional_domain_lists
+
+UNIPROT_COLUMNS = "accession,id,ft_domain,sequence,gene_names"
+# column names of the uniprot tabulated output for UNIPROT_COLUMNS
+UNIPROT_TSV_COLUMNS = {
+    "Entry": "accession",
+    "Entry Name": "entry_name",
+    "Domain [FT]": "domain",
+    "Sequence": "sequence",
+    "Gene Names": "gene_names",
+}
+# values of the UNIPROT_BACKEND setting
+UNIPROT_BACKENDS = ("remote", "local")
+
+
+def uniprot_cache_key(accession: str, backend: str = None):
+    """the remote and local backends can disagree on an entry, each caches its records under its own key"""
+    return f"uniprot:{backend or settings.UNIPROT_BACKEND}:{accession}"
+
+
+def fetch_remote_uniprot(accession: str):
+    """return the uniprot data of an accession from the uniprot rest api as a dataframe, or None if uniprot has no entry for it"""
+    parser = UniprotParser(columns=UNIPROT_COLUMNS)
+    result = list(parser.parse([accession]))
+    if len(result) == 0:
+        return None
+    return pd.read_csv(io.StringIO(result[0]), sep="\t")
+
+
+def fetch_local_uniprot(accession: str):
+    """return the uniprot data of an accession from the imported uniprot snapshot as a dataframe laid out like the uniprot rest api output, or None if the snapshot has no entry for it"""
+    entry = UniprotEntry.objects.filter(accession=accession).first()
+    if entry is None:
+        return None
+    data = {"From": accession}
+    for column, field in UNIPROT_TSV_COLUMNS.items():
+        data[column] = getattr(entry, field)
+    return pd.DataFrame([data])
+
+
+def fetch_uniprot_record(accession: str):
+    """return the uniprot data of an accession along with its functional domains from the backend chosen by the UNIPROT_BACKEND setting"""
+    if settings.UNIPROT_BACKEND == "local":
+        df = fetch_local_uniprot(accession)
+    else:
+        df = fetch_remote_uniprot(accession)
+    if df is None or df.shape[0] == 0:
+        return None
+    df["domains"] = functional_domain_lists(extract_functional_domains(df, "Domain [FT]"), df.shape[0])
+    df.fillna("", inplace=True)
+    return df.to_dict(orient="records")[0]
+
+
+def get_uniprot_record(accession: str):
+    """return the cached uniprot data of an accession, fetching and caching it for UNIPROT_CACHE_TTL seconds when it is missing"""
+    key = uniprot_cache_key(accession)
+    record = cache.get(key)
+    if record is None:
+        record = fetch_uniprot_record(accession)
+        if record is not None:
+            cache.set(key, record, settings.UNIPROT_CACHE_TTL)
+    return record
+
+
+def invalidate_uniprot_records(accessions):
+    """remove the cached uniprot data of the given accessions for every backend"""
+    cache.delete_many([uniprot_cache_key(accession, backend) for accession in accessions for backend in UNIPROT_BACKENDS])
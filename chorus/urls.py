@@ -18,12 +18,14 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 
-from chorus.viewsets import ProteinViewSets, VariantViewSets, ChorusSessionViewSets
+from chorus.viewsets import ProteinViewSets, VariantViewSets, ProteinDomainViewSets, ChorusSessionViewSets, JobViewSets
 
 router = routers.DefaultRouter()
 router.register(r'api/protein', ProteinViewSets)
 router.register(r'api/variant', VariantViewSets)
+router.register(r'api/protein_domain', ProteinDomainViewSets)
 router.register(r'api/chorus_session', ChorusSessionViewSets)
+router.register(r'api/job', JobViewSets, basename='job')
 urlpatterns = [
     path('', include(router.urls)),
     #ath('admin/', admin.site.urls),
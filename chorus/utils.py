@@ -1,68 +1,131 @@
-from copy import deepcopy
+import re
 
+import numpy as np
 import pandas as pd
 
+# a regex that capture the variant data in the form of A123B where the number is the position, A the original residue and B the mutated residue
+# the groups are named after the parsed columns so the pyarrow regex kernels can use the same regex
+VARIANT_REGEX = r"(?P<Original>[A-Z]+)(?P<Position>\d+)(?P<Mutated>[A-Z]+)"
+variant_pattern = re.compile(VARIANT_REGEX)
+_variant_separator = "\x00"
+# the first variant_pattern match of every separated value, or empty groups when the value has none
+_variant_line_pattern = re.compile(rf"[^\x00]*?{VARIANT_REGEX}[^\x00]*\x00|[^\x00]*\x00")
+
+FUNCTIONAL_DOMAIN_COLUMNS = ["accession", "domain", "start", "end"]
+# every entry is joined behind this separator and every feature field starts with a semicolon so the pattern below only has to look at those two characters
+_entry_separator = "\x00;"
+# either an entry separator, a DOMAIN line or a /note line at the start of a feature field of the uniprot Domain [FT] column
+# the start and end of a DOMAIN line are only captured when they are plain integers, uncertain positions such as <1 or ? are left as missing
+_feature_pattern = re.compile(
+    r"(\x00)"
+    r"|;\s*"
+    r"(?:(DOMAIN)\s*(?:([+-]?[0-9]+)\s*(?=\.\.)|)[^;\x00]*?(?:\.\.\s*(?:([+-]?[0-9]+)\s*(?=\.\.|[;\x00]|$)|)|(?=[;\x00]|$))[^;\x00]*"
+    r"|/note=([^;\x00]*))"
+)
+
+
+def parse_variant(variant: str):
+    """return the position, original residue and mutated residue of a variant in the form of A123B, or None if it is not one"""
+    search_result = variant_pattern.search(variant)
+    if search_result:
+        return int(search_result.group(2)), search_result.group(1), search_result.group(3)
+    return None
+
+
+def extract_variants(variants: pd.Series):
+    """
+    parse a whole column of variants in the form of A123B in one pass
+    return a dataframe with the index of variants and the Position, Original and Mutated columns, Position is a nullable integer and values that are not a variant are left missing
+    """
+    parsed = pd.DataFrame(
+        _variant_line_pattern.findall(_variant_separator.join([*variants.astype(str), ""])),
+        columns=["Original", "Position", "Mutated"],
+        index=variants.index,
+    )
+    found = (parsed["Position"] != "").to_numpy()
+    positions = np.zeros(len(parsed), dtype=np.int64)
+    positions[found] = parsed["Position"].to_numpy()[found].astype(np.int64)
+    return pd.DataFrame({
+        "Position": pd.arrays.IntegerArray(positions, ~found),
+        "Original": parsed["Original"].where(found),
+        "Mutated": parsed["Mutated"].where(found),
+    }, index=variants.index)
+
+
+def extract_variant(row: pd.Series, variant_column_name: str):
+    variant = parse_variant(row[variant_column_name])
+    if variant:
+        row["Position"], row["Original"], row["Mutated"] = variant
+    return row
+
+
+def extract_functional_domains(df: pd.DataFrame, domain_column_name: str, sequence_column_name: str = "Sequence", accession_column_name: str = "Entry"):
+    """
+    extract the functional domains of every uniprot entry of df at once from its uniprot Domain [FT] column
+    return a flat interval table with the accession, domain, start and end columns indexed by the position of the entry in df
+    the gaps before, between and after the domains are filled with Other intervals the same way extract_functional_domain does
+    """
+    present = pd.notnull(df[domain_column_name]).to_numpy()
+    entries = df[present]
+    positions = pd.RangeIndex(df.shape[0]).to_numpy()[present]
+
+    # a single pass over the joined column picks out the DOMAIN and /note feature lines, the entry separators number the entries
+    tokens = pd.DataFrame(
+        _feature_pattern.findall(";" + _entry_separator.join(entries[domain_column_name].astype(str))),
+        columns=["separator", "keyword", "start", "end", "note"],
+    )
+    tokens["row"] = (tokens["separator"] != "").cumsum()
+    tokens = tokens[tokens["separator"] == ""]
+    is_domain = (tokens["keyword"] != "").to_numpy()
+    # every DOMAIN line opens a group holding the feature qualifiers that follow it
+    tokens["group"] = pd.Series(is_domain.astype(int), index=tokens.index).groupby(tokens["row"]).cumsum()
+
+    domains = tokens[is_domain].copy()
+    domains["start"] = pd.to_numeric(domains["start"], errors="coerce").astype("Int64")
+    domains["end"] = pd.to_numeric(domains["end"], errors="coerce").astype("Int64")
+
+    notes = tokens[~is_domain & (tokens["group"] > 0).to_numpy()]
+    notes = notes.assign(domain=notes["note"].str.replace("\"", "", regex=False).str.strip())
+    domains = domains.join(notes.groupby(["row", "group"])["domain"].last(), on=["row", "group"])
+
+    # end of the closest preceding domain with a known end
+    previous_end = domains["end"].groupby(domains["row"]).ffill().groupby(domains["row"]).shift()
+    start = domains["start"]
+    leading = (start.notna() & previous_end.isna() & (start > 1)).fillna(False).astype(bool)
+    between = (start.notna() & previous_end.notna() & ((start - previous_end) > 1)).fillna(False).astype(bool)
+    gaps = domains[leading | between].assign(domain="Other", order=0)
+    gaps["end"] = gaps["start"] - 1
+    gaps["start"] = previous_end[leading | between].add(1).fillna(1)
+
+    named = domains[domains["domain"].notna() & (domains["domain"] != "")].assign(order=1)
+
+    last = domains.groupby("row").tail(1)
+    length = entries[sequence_column_name].reset_index(drop=True).str.len().to_numpy()[last["row"].to_numpy()]
+    unfinished = (last["end"].notna() & (last["end"] < length)).fillna(False).astype(bool).to_numpy()
+    trailing = last[unfinished]
+    trailing = trailing.assign(domain="Other", start=trailing["end"] + 1, end=pd.array(length[unfinished], dtype="Int64"), order=2)
+
+    table = pd.concat([gaps, named, trailing])[["row", "group", "order", "domain", "start", "end"]]
+    table = table.sort_values(["row", "group", "order"], kind="stable")
+    if accession_column_name in entries.columns:
+        table["accession"] = entries[accession_column_name].to_numpy()[table["row"].to_numpy()]
+    else:
+        table["accession"] = None
+    table.index = pd.Index(positions[table["row"].to_numpy()])
+    return table[FUNCTIONAL_DOMAIN_COLUMNS].astype({"start": "Int64", "end": "Int64"})
+
+
+def functional_domain_lists(table: pd.DataFrame, size: int):
+    """regroup an interval table from extract_functional_domains into one list of domain dictionaries per entry"""
+    domains = [[] for _ in range(size)]
+    starts = table["start"].astype(object).where(table["start"].notna(), None)
+    ends = table["end"].astype(object).where(table["end"].notna(), None)
+    for position, domain, start, end in zip(table.index, table["domain"], starts, ends):
+        domains[position].append({"domain": domain, "start": start, "end": end})
+    return domains
+
 
 def extract_functional_domain(row: pd.Series, domain_column_name: str):
-    domains = []
-    if pd.notnull(row[domain_column_name]):
-        splitted = row[domain_column_name].split(";")
-        current_domain = ""
-        current_domain_start = ""
-        current_domain_end = ""
-        previous_domain_end = None
-        for i in splitted:
-            i = i.strip()
-            if i.startswith("DOMAIN"):
-                if current_domain:
-                    domains.append(deepcopy({
-                        "domain": current_domain,
-                        "start": current_domain_start,
-                        "end": current_domain_end
-                    }))
-                current_domain = ""
-                stripped_domain = i.replace("DOMAIN", "").strip()
-                splitted_start_end = stripped_domain.split("..")
-                try:
-                    current_domain_start = int(splitted_start_end[0])
-                    print(i)
-                    if previous_domain_end is None:
-                        if current_domain_start > 1:
-                            domains.append(deepcopy({
-                                "domain": "Other",
-                                "start": 1,
-                                "end": current_domain_start - 1
-                            }))
-                        else:
-                            pass
-                    elif (current_domain_start - previous_domain_end) > 1:
-                        domains.append(deepcopy({
-                            "domain": "Other",
-                            "start": previous_domain_end + 1,
-                            "end": current_domain_start - 1
-                        }))
-                except ValueError:
-                    current_domain_start = None
-                try:
-                    current_domain_end = int(splitted_start_end[1])
-                    previous_domain_end = int(splitted_start_end[1])
-                except ValueError:
-                    current_domain_end = None
-            elif i.startswith("/note="):
-                current_domain = i.replace("/note=", "").replace("\"", "").strip()
-        if current_domain != "":
-            domains.append(deepcopy({
-                "domain": current_domain,
-                "start": current_domain_start,
-                "end": current_domain_end
-            }))
-        if previous_domain_end is None or previous_domain_end < len(row["Sequence"]):
-            domains.append(deepcopy({
-                "domain": "Other",
-                "start": current_domain_end + 1,
-                "end": len(row["Sequence"])
-            }))
-
-    row["domains"] = domains
-
-    return row
\ No newline at end of file
+    table = extract_functional_domains(pd.DataFrame([row]), domain_column_name)
+    row["domains"] = functional_domain_lists(table, 1)[0]
+    return row
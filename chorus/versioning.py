@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F
+
+from chorus.models import DatasetVersion
+
+# dataset holding the proteins, variants and domains, every ingestion or domain change bumps its version
+VARIANT_DATASET = "variant"
+# scores of the variants, only bumped when variants or their precomputed matrices are written so data derived from the scores alone,
+# like the score store, is not invalidated by domain changes
+VARIANT_SCORES_DATASET = "variant_scores"
+
+
+def dataset_version_cache_key(name: str):
+    return f"dataset_version:{name}"
+
+
+def get_dataset_version(name: str = VARIANT_DATASET):
+    """
+    return the current version of a dataset, the version is read from the cache and only looked up in the database every DATASET_VERSION_CACHE_TTL seconds
+    bumps made through a shared cache such as redis are seen right away, the ttl bounds how long a process local cache can serve an older version
+    """
+    key = dataset_version_cache_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = DatasetVersion.objects.filter(name=name).values_list("version", flat=True).first() or 0
+        cache.set(key, version, settings.DATASET_VERSION_CACHE_TTL)
+    return version
+
+
+def bump_dataset_version(name: str = VARIANT_DATASET, using: str = None):
+    """increase the version of a dataset, the cached version is replaced once the surrounding transaction commits"""
+    using = using or router.db_for_write(DatasetVersion)
+    DatasetVersion.objects.using(using).get_or_create(name=name)
+    DatasetVersion.objects.using(using).filter(name=name).update(version=F("version") + 1)
+
+    def publish():
+        version = DatasetVersion.objects.using(using).filter(name=name).values_list("version", flat=True).first()
+        cache.set(dataset_version_cache_key(name), version, settings.DATASET_VERSION_CACHE_TTL)
+
+    transaction.on_commit(publish, using=using)
@@ -1,69 +1,450 @@
-import io
+import hashlib
 
-import pandas as pd
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from filters.mixins import FiltersMixin
 from rest_framework import permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.parsers import MultiPartParser, JSONParser
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.reverse import reverse
+from rest_framework.viewsets import ModelViewSet, ViewSet
+from rq.job import JobStatus
+from rest_flex_fields import is_expanded
 
-from chorus.filter_schema import protein_query_schema, chorus_session_query_schema
-from chorus.models import Protein, Variant, ChorusSession
-from chorus.serializers import ProteinSerializer, VariantSerializer, ChorusSessionSerializer
+from chorus.domains import in_domain, locate_domains
+from chorus.export import EXPORT_FORMATS, variant_export_rows
+from chorus.filter_schema import protein_query_schema, variant_query_schema, protein_domain_query_schema, chorus_session_query_schema
+from chorus.jobs import fetch_job, discard_job, job_state, submit_figure_job, submit_ingest_alphamissense_job, submit_uniprot_job, \
+    uniprot_job_id
+from chorus.matrix import AMINO_ACIDS, variant_matrix_to_dict, variant_matrix_to_npz
+from chorus.models import Protein, Variant, ChorusSession, ProteinSummary, ProteinVariantMatrix, ProteinDomain, PATHOGENICITY_CODES
+from chorus.protein_figures import get_protein_figure
+from chorus.score_store import batch_lookup, database_lookup, get_score_store, read_batch_file
+from chorus.serializers import ProteinSerializer, VariantSerializer, ChorusSessionSerializer, ProteinDomainSerializer, \
+    ProteinPositionSerializer, ProteinFigureOptionsSerializer, JobSubmitSerializer, PROTEIN_VARIANT_FIELDS, variant_values, represent_variant_values
+from chorus.statistics import SUMMARY_HISTOGRAM_BINS, protein_summary, proteome_summary, summary_histogram, summary_score_bands, variant_score_bands
+from chorus.uniprot import get_uniprot_record, invalidate_uniprot_records
+from chorus.versioning import VARIANT_DATASET, VARIANT_SCORES_DATASET, bump_dataset_version, get_dataset_version
 
-from uniprotparser.betaparser import UniprotParser
-
-from chorus.utils import extract_functional_domain
 from django.core.files.base import File as djangoFile
 
-class ProteinViewSets(FiltersMixin, ModelViewSet):
+
+def integer_query_param(request, name: str, default=None, min_value: int = None):
+    """return an integer query parameter of a custom action, raising a validation error when it is not an integer or is below min_value"""
+    value = request.query_params.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: "Expected an integer"})
+    if min_value is not None and value < min_value:
+        raise ValidationError({name: f"Expected an integer of at least {min_value}"})
+    return value
+
+
+def boolean_query_param(request, name: str):
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+
+def job_response(request, job, status=200):
+    """respond with the state of a background job and the urls to poll it and fetch its result"""
+    url = reverse("job-detail", args=[job.id], request=request)
+    result_url = reverse("job-result", args=[job.id], request=request)
+    headers = {"Location": result_url} if status == 202 else None
+    return Response({**job_state(job), "url": url, "result_url": result_url}, status=status, headers=headers)
+
+
+class DatasetVersionMixin:
+    """bump the version of the datasets in dataset_names after every change made through the api so the figures cached for the older version are not served"""
+    dataset_names = (VARIANT_DATASET,)
+
+    def bump_dataset_versions(self):
+        for name in self.dataset_names:
+            bump_dataset_version(name)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.bump_dataset_versions()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.bump_dataset_versions()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.bump_dataset_versions()
+
+
+class VersionedCacheMixin:
+    """
+    cache the rendered json of the list and retrieve responses under their url and the version of the variant dataset so a change of the data invalidates them all at once
+    responses carry a strong etag of their content and requests whose If-None-Match matches it get a 304 without the view running
+    """
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return handler(request, *args, **kwargs)
+        key = "response:" + hashlib.sha256(f"{get_dataset_version()}:{request.build_absolute_uri()}".encode()).hexdigest()
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            content = response.render().content
+            cached = (content, response["Content-Type"], f'"{hashlib.sha256(content).hexdigest()[:32]}"')
+            cache.set(key, cached, settings.RESPONSE_CACHE_TTL)
+        content, content_type, etag = cached
+        # the gzip middleware turns the etag of compressed responses into a weak one, If-None-Match compares etags weakly anyway
+        if etag in (tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=settings.RESPONSE_CACHE_MAX_AGE, must_revalidate=True)
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+class ProteinViewSets(VersionedCacheMixin, DatasetVersionMixin, FiltersMixin, ModelViewSet):
     queryset = Protein.objects.all()
     serializer_class = ProteinSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     filter_backends = [filters.OrderingFilter,]
     ordering_fields = ["name"]
+    keyset_ordering = ("id",)
     filter_mappings = {
         "name": "name__icontains",
     }
     filter_validation_schema = protein_query_schema
 
     def get_queryset(self):
+        if self.action in ("list", "retrieve") and is_expanded(self.request, "variants"):
+            return self.queryset.prefetch_related(
+                Prefetch("variant_set", queryset=Variant.objects.only(*PROTEIN_VARIANT_FIELDS))
+            )
         return self.queryset
 
+    @action(detail=True, methods=["get"], keyset_ordering=("protein_id", "position", "id"))
+    def variants(self, request, pk=None):
+        protein = self.get_object()
+        queryset = variant_values(Variant.objects.filter(protein_id=protein.id).order_by("position", "id"))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(represent_variant_values(page))
+        return Response(represent_variant_values(queryset))
+
+    @action(detail=True, methods=["get"])
+    def matrix(self, request, pk=None):
+        protein = self.get_object()
+        try:
+            matrix = ProteinVariantMatrix.objects.get(protein_id=protein.id)
+        except ProteinVariantMatrix.DoesNotExist:
+            return Response(status=404)
+        if request.query_params.get("output", "npz") == "json":
+            return Response(variant_matrix_to_dict(matrix))
+        response = HttpResponse(variant_matrix_to_npz(matrix), content_type="application/octet-stream")
+        response["Content-Disposition"] = f'attachment; filename="{protein.name}.npz"'
+        response["X-Matrix-Alphabet"] = AMINO_ACIDS
+        response["X-Matrix-Length"] = matrix.length
+        return response
+
+    @action(detail=True, methods=["get"])
+    def score_bands(self, request, pk=None):
+        protein = self.get_object()
+        bin_size = integer_query_param(request, "bin", 1, min_value=1)
+        position_start = integer_query_param(request, "position_start")
+        position_end = integer_query_param(request, "position_end")
+        summary = ProteinSummary.objects.filter(protein_id=protein.id).first()
+        if summary is not None:
+            return Response({"protein": protein.name, "bin": bin_size, **summary_score_bands(summary, bin_size, position_start, position_end)})
+        queryset = Variant.objects.filter(protein_id=protein.id)
+        if position_start is not None:
+            queryset = queryset.filter(position__gte=position_start)
+        if position_end is not None:
+            queryset = queryset.filter(position__lte=position_end)
+        return Response({"protein": protein.name, "bin": bin_size, **variant_score_bands(queryset, bin_size)})
+
+    @action(detail=True, methods=["get"])
+    def summary(self, request, pk=None):
+        protein = self.get_object()
+        position_start = integer_query_param(request, "position_start", min_value=1)
+        position_end = integer_query_param(request, "position_end", min_value=1)
+        try:
+            summary = ProteinSummary.objects.get(protein_id=protein.id)
+        except ProteinSummary.DoesNotExist:
+            return Response(status=404)
+        return Response({"protein": protein.name, **protein_summary(summary, position_start, position_end)})
+
+    @action(detail=True, methods=["get"])
+    def histogram(self, request, pk=None):
+        protein = self.get_object()
+        bins = self.histogram_bins(request)
+        histogram = ProteinSummary.objects.filter(protein_id=protein.id).values_list("histogram", flat=True).first()
+        if histogram is None:
+            return Response(status=404)
+        return Response({"protein": protein.name, "bins": bins, **summary_histogram([histogram], bins)})
+
+    @action(detail=False, methods=["get"])
+    def proteome_summary(self, request):
+        proteins = self.filter_queryset(self.get_queryset())
+        return Response(proteome_summary(ProteinSummary.objects.filter(protein__in=proteins.values("id"))))
+
+    @action(detail=False, methods=["get"])
+    def proteome_histogram(self, request):
+        bins = self.histogram_bins(request)
+        proteins = self.filter_queryset(self.get_queryset())
+        histograms = ProteinSummary.objects.filter(protein__in=proteins.values("id")).values_list("histogram", flat=True)
+        return Response({"bins": bins, **summary_histogram(histograms.iterator(chunk_size=2000), bins)})
+
+    def histogram_bins(self, request):
+        bins = integer_query_param(request, "bins", SUMMARY_HISTOGRAM_BINS, min_value=1)
+        if SUMMARY_HISTOGRAM_BINS % bins:
+            raise ValidationError({"bins": f"Expected a number of bins dividing {SUMMARY_HISTOGRAM_BINS}"})
+        return bins
+
+    @action(detail=True, methods=["get"])
+    def figure(self, request, pk=None):
+        protein = self.get_object()
+        serializer = ProteinFigureOptionsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        if boolean_query_param(request, "async"):
+            return job_response(request, submit_figure_job(protein, serializer.validated_data), status=202)
+        figure, key = get_protein_figure(protein, serializer.validated_data)
+        content_type = "text/html" if serializer.validated_data.get("output") == "html" else "application/json"
+        response = HttpResponse(figure, content_type=content_type)
+        response["X-Figure-Key"] = key
+        return response
+
     @action(detail=True, methods=["get"])
+    def domains(self, request, pk=None):
+        protein = self.get_object()
+        queryset = ProteinDomain.objects.effective().filter(protein_id=protein.id).select_related("protein")
+        return Response(ProteinDomainSerializer(queryset, many=True).data)
+
+    @action(detail=True, methods=["get", "delete"])
     def get_uniprot(self, request, pk=None):
         protein = self.get_object()
-        parser = UniprotParser(columns="accession,id,ft_domain,sequence,gene_names")
-        result = list(parser.parse([protein.name]))
-        if len(result) > 0:
-            df = pd.read_csv(io.StringIO(result[0]), sep="\t")
-            df = df.apply(lambda x: extract_functional_domain(x, "Domain [FT]"), axis=1)
-            df.fillna("", inplace=True)
-            return Response(df.to_dict(orient="records")[0])
+        if request.method == "DELETE":
+            invalidate_uniprot_records([protein.name])
+            discard_job(uniprot_job_id(protein.name))
+            return Response(status=204)
+        if boolean_query_param(request, "async"):
+            return job_response(request, submit_uniprot_job(protein.name), status=202)
+        record = get_uniprot_record(protein.name)
+        if record is not None:
+            return Response(record)
         else:
             return Response(status=404)
 
 
-class VariantViewSets(FiltersMixin, ModelViewSet):
+class VariantViewSets(VersionedCacheMixin, DatasetVersionMixin, FiltersMixin, ModelViewSet):
     queryset = Variant.objects.all()
     serializer_class = VariantSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     filter_backends = [filters.OrderingFilter,]
     ordering_fields = ["protein", "position", "original", "mutated", "pathogenicity"]
+    keyset_ordering = ("protein_id", "position", "id")
     filter_mappings = {
         "protein": "protein__name__exact",
         "position": "position__exact",
+        "position_start": "position__gte",
+        "position_end": "position__lte",
         "original": "original__exact",
         "mutated": "mutated__exact",
         "pathogenicity": "pathogenicity__exact",
+        "score_min": "score__gte",
+        "score_max": "score__lte",
     }
-    filter_validation_schema = protein_query_schema
+    filter_value_transformations = {
+        "pathogenicity": lambda value: PATHOGENICITY_CODES.get(value.strip().lower()),
+    }
+    filter_validation_schema = variant_query_schema
+    dataset_names = (VARIANT_DATASET, VARIANT_SCORES_DATASET)
+    # flex fields query parameters that need the full serializer instead of the values based fast path
+    flex_fields_params = ("fields", "omit", "expand")
+    # maximum number of variants accepted by a single batch lookup request
+    max_batch_items = 100000
 
     def get_queryset(self):
-        return self.queryset
+        queryset = self.queryset.select_related("protein").only(
+            "id", "protein_id", "position", "original", "mutated", "score", "pathogenicity", "protein__name"
+        )
+        domain = self.request.query_params.get("domain")
+        if domain:
+            queryset = queryset.filter(in_domain(domain))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if any(param in request.query_params for param in self.flex_fields_params):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, self.list_values, *args, **kwargs)
+
+    def list_values(self, request, *args, **kwargs):
+        queryset = variant_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(represent_variant_values(page))
+        return Response(represent_variant_values(queryset))
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({"output": f"Expected one of {', '.join(EXPORT_FORMATS)}"})
+        content_type, extension, write = EXPORT_FORMATS[output]
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(write(variant_export_rows(queryset)), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="variants.{extension}"'
+        return response
+
+    @action(detail=False, methods=["get"])
+    def lookup(self, request):
+        protein = request.query_params.get("protein")
+        if not protein:
+            raise ValidationError({"protein": "This parameter is required"})
+        position = integer_query_param(request, "position", min_value=1)
+        if position is not None:
+            position_start = position_end = position
+        else:
+            position_start = integer_query_param(request, "position_start", min_value=1)
+            position_end = integer_query_param(request, "position_end", min_value=1)
+        mutated = request.query_params.get("mutated", "").strip().upper() or None
+        store = get_score_store()
+        if store is not None:
+            response = Response(store.lookup(protein, position_start, position_end, mutated))
+            response["X-Variant-Backend"] = "store"
+        else:
+            response = Response(database_lookup(protein, position_start, position_end, mutated))
+            response["X-Variant-Backend"] = "database"
+        return response
+
+    @action(detail=False, methods=["post"], permission_classes=[permissions.AllowAny], parser_classes=[JSONParser, MultiPartParser])
+    def batch_lookup(self, request):
+        if "file" in request.FILES:
+            try:
+                proteins, variants = read_batch_file(request.FILES["file"])
+            except (ValueError, UnicodeDecodeError) as e:
+                raise ValidationError({"file": f"Expected a tab separated file of accessions and variants, {e}"})
+        else:
+            if not isinstance(request.data, list):
+                raise ValidationError("Expected a list of protein and variant pairs or a tab separated file")
+            proteins, variants = [], []
+            for i, item in enumerate(request.data):
+                if isinstance(item, dict):
+                    item = (item.get("protein"), item.get("variant"))
+                if not isinstance(item, (list, tuple)) or len(item) != 2 or not all(isinstance(value, str) for value in item):
+                    raise ValidationError(f"Item {i} is not a protein and variant pair")
+                proteins.append(item[0])
+                variants.append(item[1])
+        if len(proteins) > self.max_batch_items:
+            raise ValidationError(f"At most {self.max_batch_items} variants can be looked up per request")
+        results, backend = batch_lookup(proteins, variants, self.queryset.db)
+        response = Response(results)
+        response["X-Variant-Backend"] = backend
+        return response
+
+
+class ProteinDomainViewSets(DatasetVersionMixin, FiltersMixin, ModelViewSet):
+    queryset = ProteinDomain.objects.all()
+    serializer_class = ProteinDomainSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    filter_backends = [filters.OrderingFilter,]
+    ordering_fields = ["protein", "domain", "start", "end"]
+    keyset_ordering = ("protein_id", "start", "id")
+    filter_mappings = {
+        "protein": "protein__name__in",
+        "domain": "domain__exact",
+        "source": "source__exact",
+    }
+    filter_value_transformations = {
+        "protein": lambda value: value.split(","),
+    }
+    filter_validation_schema = protein_domain_query_schema
+    # maximum number of protein and position pairs accepted by a single locate request
+    max_locate_items = 10000
+
+    def get_queryset(self):
+        queryset = self.queryset.select_related("protein")
+        if self.action != "list":
+            return queryset
+        queryset = queryset.effective()
+        position = integer_query_param(self.request, "position")
+        if position is not None:
+            queryset = queryset.filter(start__lte=position, end__gte=position)
+        return queryset
+
+    @action(detail=False, methods=["post"], permission_classes=[permissions.AllowAny])
+    def locate(self, request):
+        serializer = ProteinPositionSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if len(serializer.validated_data) > self.max_locate_items:
+            raise ValidationError(f"At most {self.max_locate_items} positions can be located per request")
+        items = [(item["protein"], item["position"]) for item in serializer.validated_data]
+        return Response([
+            {"protein": protein, "position": position, "domains": domains}
+            for (protein, position), domains in zip(items, locate_domains(items, self.queryset.db))
+        ])
+
+
+class JobViewSets(ViewSet):
+    permission_classes = (permissions.AllowAny,)
+    lookup_value_regex = r"[A-Za-z0-9_-]+"
+
+    def get_job(self, pk):
+        job = fetch_job(pk)
+        if job is None:
+            raise NotFound("No job with this id, or its result has expired")
+        return job
+
+    def create(self, request):
+        serializer = JobSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if data["kind"] == "ingest_alphamissense":
+            if not request.user.is_staff:
+                raise PermissionDenied("Only staff users can load files")
+            job = submit_ingest_alphamissense_job(data["file_path"], data["method"], data["materialize"])
+        elif data["kind"] == "uniprot":
+            job = submit_uniprot_job(data["protein"])
+        else:
+            protein = Protein.objects.filter(name=data["protein"]).first()
+            if protein is None:
+                raise ValidationError({"protein": f"No protein named {data['protein']}"})
+            job = submit_figure_job(protein, data.get("options", {}))
+        return job_response(request, job, status=202)
+
+    def retrieve(self, request, pk=None):
+        return job_response(request, self.get_job(pk))
+
+    @action(detail=True, methods=["get"])
+    def result(self, request, pk=None):
+        job = self.get_job(pk)
+        job_status = job.get_status()
+        if job_status == JobStatus.FINISHED:
+            result = job.return_value()
+            if job.meta.get("kind") == "figure":
+                return HttpResponse(result, content_type=job.meta["content_type"])
+            if result is None:
+                return Response(status=404)
+            return Response(result)
+        if job_status in (JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED):
+            return job_response(request, job, status=500)
+        return job_response(request, job, status=202)
 
 
 class ChorusSessionViewSets(ModelViewSet):
@@ -1,15 +1,10 @@
 import io
-import os.path
-import re
-import csv
 import pandas as pd
 from uniprotparser.betaparser import UniprotParser, UniprotSequence
-from copy import deepcopy
 from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-# a regex pattern that capture the variant data from the variant column in the form of A123B where the number should be extracted as position, A would be extracted as original residue while B would be mutated residue
-
-pattern = re.compile(r"([A-Z]+)(\d+)([A-Z]+)")
+from chorus.alphamissense import AlphaMissenseIndex
+from chorus.figures import scatter_class
+from chorus.utils import extract_functional_domains, extract_variants, functional_domain_lists
 custom_domain = {
     "Q5S007": [
         {"start": 1, "end": 705, "domain": "ARM"},
@@ -22,86 +17,13 @@ custom_domain = {
     ]
 }
 
-def extract_variant(row: pd.Series, variant_column_name: str):
-    search_result = pattern.search(row[variant_column_name])
-    if search_result:
-        row["Position"] = int(search_result.group(2))
-        row["Original"] = search_result.group(1)
-        row["Mutated"] = search_result.group(3)
-
-    return row
-
-def extract_functional_domain(row: pd.Series, domain_column_name: str):
-    domains = []
-    if pd.notnull(row[domain_column_name]):
-        splitted = row[domain_column_name].split(";")
-        current_domain = ""
-        current_domain_start = ""
-        current_domain_end = ""
-        previous_domain_end = None
-        for i in splitted:
-            i = i.strip()
-            if i.startswith("DOMAIN"):
-                if current_domain:
-                    domains.append(deepcopy({
-                        "domain": current_domain,
-                        "start": current_domain_start,
-                        "end": current_domain_end
-                    }))
-                current_domain = ""
-                stripped_domain = i.replace("DOMAIN", "").strip()
-                splitted_start_end = stripped_domain.split("..")
-                try:
-                    current_domain_start = int(splitted_start_end[0])
-                    print(i)
-                    if previous_domain_end is None:
-                        if current_domain_start > 1:
-                            domains.append(deepcopy({
-                                "domain": "Other",
-                                "start": 1,
-                                "end": current_domain_start - 1
-                            }))
-                        else:
-                            pass
-                    elif (current_domain_start - previous_domain_end) > 1:
-                        domains.append(deepcopy({
-                            "domain": "Other",
-                            "start": previous_domain_end + 1,
-                            "end": current_domain_start - 1
-                        }))
-                except ValueError:
-                    current_domain_start = None
-                try:
-                    current_domain_end = int(splitted_start_end[1])
-                    previous_domain_end = int(splitted_start_end[1])
-                except ValueError:
-                    current_domain_end = None
-            elif i.startswith("/note="):
-                current_domain = i.replace("/note=", "").replace("\"", "").strip()
-        if current_domain != "":
-            domains.append(deepcopy({
-                "domain": current_domain,
-                "start": current_domain_start,
-                "end": current_domain_end
-            }))
-        if previous_domain_end is None or previous_domain_end < len(row["Sequence"]):
-            domains.append(deepcopy({
-                "domain": "Other",
-                "start": current_domain_end + 1,
-                "end": len(row["Sequence"])
-            }))
-
-    row["domains"] = domains
-
-    return row
-
 def process_excel_file(file_path: str, variant_column_name: str, uniprotID: str):
     try:
         df = pd.read_excel(file_path, engine="openpyxl", sheet_name="all", skiprows=1)
     except ValueError:
         df = pd.read_excel(file_path, engine="openpyxl", skiprows=1)
     df["Amino acid change"] = df["Amino acid change"].str.replace("p.", "")
-    df = df.apply(lambda x: extract_variant(x, variant_column_name), axis=1)
+    df[["Position", "Original", "Mutated"]] = extract_variants(df[variant_column_name])
     df = df[["Position", "Original", "Mutated", "Clinical significance (ClinVar)"]]
     df["UniprotID"] = uniprotID
     return df
@@ -116,21 +38,8 @@ if __name__ == "__main__":
     gba = process_excel_file("data/PD Variant Browser GBA.xlsx", "Amino acid change", "P04062")
     park7 = process_excel_file("data/PD Variant Browser PARK7 (DJ1).xlsx", "Amino acid change", "Q99497")
     concat_df = pd.concat([lrrk2, vps35, pink1, prkn, snca, gba, park7], ignore_index=True)
-    if not os.path.exists("data/alpha.txt"):
-        results = []
-        with open("data/AlphaMissense_aa_substitutions.tsv", "rt") as alpha:
-            reader = csv.reader(alpha, delimiter="\t")
-            for line in reader:
-                if line[0] in select_uniprots:
-                    results.append(line)
-
-        df = pd.DataFrame(results, columns=["UniprotID", "Variant", "Score", "Pathogenicity"])
-        df["Score"] = df["Score"].astype(float)
-
-        df = df.apply(lambda x: extract_variant(x, "Variant"), axis=1)
-        df.to_csv("data/alpha.txt", sep="\t", index=False)
-    else:
-        df = pd.read_csv("data/alpha.txt", sep="\t")
+    df = AlphaMissenseIndex.open("data/AlphaMissense_aa_substitutions.tsv").read_dataframe(select_uniprots)
+    df[["Position", "Original", "Mutated"]] = extract_variants(df["Variant"])
     color_discrete_map = {
         "pathogenic": "#ff5671",
         "ambiguous": "#ffc955",
@@ -145,7 +54,7 @@ if __name__ == "__main__":
     else:
         results = pd.concat(results)
 
-    results = results.apply(lambda x: extract_functional_domain(x, "Domain [FT]"), axis=1)
+    results["domains"] = functional_domain_lists(extract_functional_domains(results, "Domain [FT]"), results.shape[0])
     for i, row in results.iterrows():
         alpha_df = df[df["UniprotID"] == row["From"]]
         study = concat_df[concat_df["UniprotID"] == row["From"]]
@@ -160,6 +69,7 @@ if __name__ == "__main__":
             for k in dropdown_option:
                 dropdown_option[k][v] = []
 
+        scatter = scatter_class(study.shape[0])
         for j, study_sub in study.groupby(["Pathogenicity"]):
             customtext = []
 
@@ -173,7 +83,7 @@ if __name__ == "__main__":
                 dropdown_option["All (PD Browser Variants)"][j[0]].append(1)
 
             fig.add_trace(
-                go.Scatter(
+                scatter(
                     name=j[0],
                     x=study_sub["Position"],
                     y=study_sub["Score"],